@@ -0,0 +1,198 @@
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import open3d as o3d
+
+import geometry
+import ray_sets
+import timing
+import tracer
+
+# canonical scenes, each traced with a fixed seeded ray bundle
+# (ray_sets.random_disc of r_max, N_rays, pos, dir) and bounce limit:
+#   design     overrides of geometry.design(), None for the full default
+#   meshes     names of the meshes to keep, None for all of them
+#   rays       (r_max, N_rays, pos, dir) of the launch disc
+#   N_bounces  bounce limit; no Russian roulette, so the work is fixed
+BENCHMARKS = {
+    # one full-resolution mirror, looked at down the boresight: raw cast
+    # and gather throughput
+    'primary_only': dict(
+        design=None,
+        meshes=['primary'],
+        rays=(1., 200000, [0., 0., 10.], [0., 0., -1.]),
+        N_bounces=10,
+    ),
+    # everything, louvers and spider included, from 40 deg above boresight
+    'default_design': dict(
+        design=None,
+        meshes=None,
+        rays=(3., 200000, [0., 10. * np.sin(40. * np.pi / 180.), 10. * np.cos(40. * np.pi / 180.)],
+              [0., -np.sin(40. * np.pi / 180.), -np.cos(40. * np.pi / 180.)]),
+        N_bounces=50,
+    ),
+    # twice as many, shallower louver vanes, lit from straight above the
+    # roof, so most rays bounce between vanes
+    'louvers_heavy': dict(
+        design=dict(louvers=True, corrugation_height=(1.5 / 12.) * .3048),
+        meshes=None,
+        rays=(1.5, 200000, [0., 10., 0.8], [0., -1., 0.]),
+        N_bounces=50,
+    ),
+}
+max_consecutive_hits = 10 # indicates a ray may be trapped inside a mesh
+mesh_res_factor = 1. # as geometry.MESH_RES_FACTOR
+repeats = 3 # traces per scene, the fastest counts
+seed = ray_sets.SEED
+# results are saved here, one JSON file per run
+out_dir = 'benchmark_results'
+# a previous results file to compare against, e.g. before a change or from
+# another machine
+baseline = None
+
+
+def run_benchmark(i_bench, name):
+    # build and trace one scene, in a fresh process (see __main__): geometry
+    # build time (nothing cached), scene build time, and the fastest of
+    # repeats traces of the same rays
+    bench = BENCHMARKS[name]
+    config = dict(bench['design'] or {}, mesh_res_factor=mesh_res_factor)
+    t0 = time.perf_counter()
+    meshes, mesh_names, absorber_meshes, system_hull = geometry.get_geometry(config)
+    build_time = time.perf_counter() - t0
+    build_times = dict(geometry.BUILD_TIMES)
+    if bench['meshes'] is not None:
+        keep = [i for i, n in enumerate(mesh_names[1:]) if n in bench['meshes']]
+        meshes = [meshes[i] for i in keep]
+        mesh_names = ['inf'] + [mesh_names[1:][i] for i in keep]
+        absorber_meshes = [m for m in absorber_meshes if any(m is k for k in meshes)]
+        system_hull = None
+    t0 = time.perf_counter()
+    tscene = tracer.TraceScene(meshes, mesh_names, absorber_meshes, system_hull)
+    scene_time = time.perf_counter() - t0
+
+    r_max, N_rays, pos, dir = bench['rays']
+    rays, N_rays = ray_sets.random_disc(
+        r_max, N_rays, np.array(pos), np.array(dir),
+        rng=ray_sets.rng_stream(seed, i_bench, ray_sets.RAYS_STREAM)
+    )
+    rays = rays.numpy()
+    trace_times = []
+    stages_before = timing.totals()
+    for i_repeat in range(repeats):
+        t0 = time.perf_counter()
+        paths = tracer.trace(
+            tscene,
+            rays,
+            bench['N_bounces'],
+            max_consecutive_hits,
+            check_incident=system_hull is not None,
+            rng=ray_sets.rng_stream(seed, i_bench, ray_sets.TRACE_STREAM)
+        )
+        trace_times.append(time.perf_counter() - t0)
+    # seconds per trace in each stage of the bounce loop
+    stages = {
+        k: (v[1] - stages_before.get(k, [0, 0., 0])[1]) / repeats
+        for k, v in timing.totals().items() if k in ['cast', 'bounce']
+    }
+    hits = int(np.sum(paths.n_bounces - 1))
+    trace_time = min(trace_times)
+    return dict(
+        name=name,
+        design=geometry.design(config),
+        meshes=mesh_names[1:],
+        n_triangles=int(sum(len(m.triangle['indices']) for m in meshes)),
+        N_rays=int(N_rays),
+        N_bounces=bench['N_bounces'],
+        hits=hits,
+        build_time=build_time,
+        build_times=build_times,
+        scene_time=scene_time,
+        trace_times=trace_times,
+        stage_times=stages,
+        rays_per_s=N_rays / trace_time,
+        bounces_per_s=hits / trace_time,
+        # ru_maxrss is in kB on Linux
+        peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.,
+    )
+
+
+def machine_info():
+    # what the results depend on besides the code, and the code's commit
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(
+        host=platform.node(),
+        platform=platform.platform(),
+        processor=platform.processor(),
+        cpu_count=os.cpu_count(),
+        python=sys.version.split()[0],
+        numpy=np.__version__,
+        open3d=o3d.__version__,
+        commit=commit,
+    )
+
+
+def results_table(results, baseline_results=None):
+    # printable table of a run, with the speedup in rays/s over a baseline
+    # run's scene of the same name, if given
+    baseline_rate = {r['name']: r['rays_per_s'] for r in baseline_results or []}
+    lines = [
+        f'{"scene":<16} {"triangles":>10} {"rays":>8} {"hits":>9} {"build s":>8} ' +
+        f'{"scene s":>8} {"trace s":>8} {"rays/s":>10} {"bounces/s":>10} {"peak MB":>8}' +
+        (f' {"speedup":>8}' if baseline_results else '')
+    ]
+    for r in results:
+        line = (
+            f'{r["name"]:<16} {r["n_triangles"]:>10d} {r["N_rays"]:>8d} {r["hits"]:>9d} ' +
+            f'{r["build_time"]:>8.2f} {r["scene_time"]:>8.2f} {min(r["trace_times"]):>8.2f} ' +
+            f'{r["rays_per_s"]:>10.0f} {r["bounces_per_s"]:>10.0f} {r["peak_rss_mb"]:>8.0f}'
+        )
+        if r['name'] in baseline_rate:
+            line += f' {r["rays_per_s"] / baseline_rate[r["name"]]:>8.2f}'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    results = []
+    for i_bench, name in enumerate(BENCHMARKS):
+        print(f'Benchmarking {name}...')
+        # a fresh process per scene, so each has its own peak RSS and
+        # builds its geometry from scratch, with no meshes cached by others
+        with mp.get_context('spawn').Pool(1) as pool:
+            results.append(pool.apply(run_benchmark, (i_bench, name)))
+
+    report = dict(
+        time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        machine=machine_info(),
+        mesh_res_factor=mesh_res_factor,
+        repeats=repeats,
+        seed=seed,
+        benchmarks=results,
+    )
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f'benchmark_{platform.node()}_{time.strftime("%Y%m%dT%H%M%S")}.json')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f'Saved {path}')
+
+    baseline_results = None
+    if baseline is not None:
+        with open(baseline) as f:
+            baseline_results = json.load(f)['benchmarks']
+    print(results_table(results, baseline_results))
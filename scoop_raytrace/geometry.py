@@ -1,7 +1,20 @@
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+
 import numpy as np
 
 import open3d as o3d
 
+import timing
+
+# built geometry is cached here, keyed by the design parameters below
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geometry_cache')
 
 # sometimes useful to downsample primary/secondary meshes for faster debugging
 MESH_RES_FACTOR = 1
@@ -28,13 +41,83 @@ corrugation_angle = 27.6 * np.pi / 180. # scoop exclusion angle
 corrugation_height = (3. / 12.) * .3048 # radial space taken up by louvers
 corrugation_thickness = (.5 / 12.) * .3048 # assume 0.5" thick foamular board
 
+# design variants: each overrides some of the defaults from design()
+DESIGNS = {
+    # full-length scoop, no roof louvers or spider, primary as catcher
+    'default_design': dict(dh=0, louvers=False, spider=False, primary_absorber=True),
+    # shortened scoop with roof louvers
+    'evans_design': dict(dh=-1.5, louvers=True, spider=False, primary_absorber=True),
+    'shortened_no_louvers': dict(dh=-1.5, louvers=False, spider=False, primary_absorber=True),
+}
+
+# meshes that only depend on mesh resolution, which every design of a sweep
+# can share, see tracer.MeshLayer
+SHARED_MESHES = ['primary', 'secondary', 'cryostat_window', 'spider']
+
+
+# optical properties of each kind of surface, attached to its meshes as
+# per-triangle attributes: the fraction of power reflected, the fraction
+# absorbed (tallied per surface, see stats.RunningStats; whatever is left is
+# lost, e.g. transmitted), and the fraction of reflections that are diffuse
+# (Lambertian) rather than specular. Absorber meshes take all the power that
+# reaches them regardless.
+SURFACE_OPTICS = {
+    'scoop': dict(reflectance=0.99, absorptance=0.01, diffuse=0.), # aluminized
+    'rear_shield': dict(reflectance=0., absorptance=1., diffuse=0.),
+    'primary': dict(reflectance=0.99, absorptance=0.01, diffuse=0.),
+    'secondary': dict(reflectance=0.99, absorptance=0.01, diffuse=0.),
+    'cryostat_window': dict(reflectance=0., absorptance=1., diffuse=0.),
+    'spider': dict(reflectance=0.99, absorptance=0.01, diffuse=0.),
+    # mylarized side of mli, e.g. for earth glow
+    'louvers': dict(reflectance=0.7, absorptance=0.3, diffuse=0.),
+}
+
+
+def design(config=None):
+    # complete design description: the module-level defaults, overridden by
+    # config, which may be a dict or the name of an entry in DESIGNS
+    d = dict(
+        dh=dh, # shorten the scoop?
+        corrugation_angle=corrugation_angle, # louver vane angle
+        corrugation_height=corrugation_height, # louver vane depth
+        louvers=True, # roof louvers in place of the top scoop panels
+        spider=True, # secondary mirror tripod legs
+        primary_absorber=False, # terminate rays on the primary
+        mesh_res_factor=MESH_RES_FACTOR,
+    )
+    if isinstance(config, str):
+        config = DESIGNS[config]
+    unknown = set(config or {}) - set(d)
+    if unknown:
+        raise ValueError(f'Unknown design parameters {sorted(unknown)}')
+    d.update(config or {})
+    return d
+
+
 # -----------------------------------------------------------------------------
 # Meshes
 # -----------------------------------------------------------------------------
-def get_geometry():
+# seconds spent building each component in the last get_geometry() call;
+# mirrors and spider read back from the lru_cache show up as ~0. Each is
+# also a timing record of stage, see timing.STAGES.
+BUILD_TIMES = {}
+
+
+@contextlib.contextmanager
+def build_timer(component, stage='geometry'):
+    t0 = time.perf_counter()
+    yield
+    BUILD_TIMES[component] = time.perf_counter() - t0
+    timing.record(stage, BUILD_TIMES[component], component=component)
+
+
+# the mirrors and spider only depend on mesh resolution, so designs traced in
+# the same process share them instead of rebuilding
+@functools.lru_cache(maxsize=None)
+def get_primary(mesh_res_factor):
     # all units meters, rad
     # primary mirror
-    x = np.linspace(r_in, r_out, num=int(500 * MESH_RES_FACTOR))
+    x = np.linspace(r_in, r_out, num=int(500 * mesh_res_factor))
     y = np.zeros_like(x)
     z = x**2 / 4. / f
     # add a bottom layer to the mirror
@@ -47,17 +130,17 @@ def get_geometry():
     pairs = [p % len(x) for p in pairs]
     primary_profile_pairs = np.array(list(zip(pairs[:-1], pairs[1:])))
     mirror_profile = o3d.t.geometry.LineSet(primary_profile_points, primary_profile_pairs)
-    primary = mirror_profile.extrude_rotation(360., [0, 0, 1], resolution=int(500 * MESH_RES_FACTOR))
-    # color
-    primary.compute_vertex_normals()
-    primary.compute_triangle_normals()
-    primary = o3d.t.geometry.TriangleMesh.to_legacy(primary)
-    primary.paint_uniform_color([0.5, 0.8, 0.5])
-    primary.orient_triangles()
-    primary = o3d.t.geometry.TriangleMesh.from_legacy(primary)
+    primary = mirror_profile.extrude_rotation(360., [0, 0, 1], resolution=int(500 * mesh_res_factor))
+    finish_mesh(primary, [0.5, 0.8, 0.5])
+    # front and back faces are paraboloids, conic constant -1
+    set_quadrics(primary, [(0., 2. * f, 0.), (-t, 2. * f, 0.)])
+    return primary
 
+
+@functools.lru_cache(maxsize=None)
+def get_secondary(mesh_res_factor):
     # secondary mirror
-    x_sec = np.linspace(r_sec_in, r_sec_out, num=int(500 * MESH_RES_FACTOR))
+    x_sec = np.linspace(r_sec_in, r_sec_out, num=int(500 * mesh_res_factor))
     y_sec = np.zeros_like(x_sec)
     z_sec = (x_sec ** 2) / (roc + np.sqrt(roc ** 2 + 1.263498 * x_sec ** 2)) # spec'd in sec CAD
     x_sec = np.concatenate([x_sec, x_sec[::-1]])
@@ -65,19 +148,19 @@ def get_geometry():
     z_sec = np.concatenate([z_sec, np.ones_like(z_sec) * z_sec.min() + t_sec])
     secondary_profile_points = np.vstack([x_sec, y_sec, z_sec]).T
     pairs = np.arange(0, len(secondary_profile_points)+1)
-    pairs = [p % len(x) for p in pairs]
+    pairs = [p % len(x_sec) for p in pairs]
     secondary_profile_pairs = np.array(list(zip(pairs[:-1], pairs[1:])))
     sec_mirror_profile = o3d.t.geometry.LineSet(secondary_profile_points, secondary_profile_pairs)
-    secondary = sec_mirror_profile.extrude_rotation(360., [0, 0, 1], resolution=int(500 * MESH_RES_FACTOR))
+    secondary = sec_mirror_profile.extrude_rotation(360., [0, 0, 1], resolution=int(500 * mesh_res_factor))
     secondary.translate([0, 0, h_sec_vertex])
-    # color
-    secondary.compute_vertex_normals()
-    secondary.compute_triangle_normals()
-    secondary = o3d.t.geometry.TriangleMesh.to_legacy(secondary)
-    secondary.paint_uniform_color([0.3, 0.3, 0.8])
-    secondary.orient_triangles()
-    secondary = o3d.t.geometry.TriangleMesh.from_legacy(secondary)
+    finish_mesh(secondary, [0.3, 0.3, 0.8])
+    # the front face is a conic; the back is flat
+    set_quadrics(secondary, [(h_sec_vertex, roc, -1.263498)])
+    return secondary
 
+
+@functools.lru_cache(maxsize=None)
+def get_spider(mesh_res_factor):
     # tripod legs
     d_spider = 54e-3
     h_spider = 1401.27e-3 + 2 * 40e-3
@@ -94,87 +177,27 @@ def get_geometry():
         r_spider_lower_attachment
         - (h_spider / 2.) * np.sin(phi_spider)
         + spider_attachment_spacing
-        + z.max()
+        + r_out**2 / 4. / f # primary rim height
     ) # final location of midpoint of strut cylinder
     proto_spider = o3d.t.geometry.TriangleMesh.create_cylinder(
         radius=d_spider/2.,
         height=h_spider,
-        resolution=int(500 * MESH_RES_FACTOR),
+        resolution=int(500 * mesh_res_factor),
         split=1
     )
     proto_spider.translate([0, y_spider, z_spider])
-    proto_spider = o3d.t.geometry.TriangleMesh.to_legacy(proto_spider)
-    R = proto_spider.get_rotation_matrix_from_axis_angle([-(np.pi/2. - phi_spider), 0, 0])
-    proto_spider.rotate(R)
-    proto_spider.paint_uniform_color([0.3, 0.3, 0.3])
-    proto_spider = o3d.t.geometry.TriangleMesh.from_legacy(proto_spider)
+    rotate_mesh(proto_spider, [-(np.pi/2. - phi_spider), 0, 0])
     spider = []
     for i in range(3):
         this_spider = proto_spider.clone()
-        this_spider = o3d.t.geometry.TriangleMesh.to_legacy(this_spider)
-        R = this_spider.get_rotation_matrix_from_axis_angle([0., 0., i * 120. * np.pi / 180.])
-        this_spider.rotate(R, center=[0.,0.,0.])
-        spider.append(o3d.t.geometry.TriangleMesh.from_legacy(this_spider))
+        rotate_mesh(this_spider, [0., 0., i * 120. * np.pi / 180.], center=[0., 0., 0.])
+        spider.append(this_spider)
+    # one mesh, triangle['part'] is the leg
+    return finish_mesh(merge_meshes(spider), [0.3, 0.3, 0.3])
 
-    # scoop
-    # let the scoop be a thin shell, to remain manifold
-    print(f'scoop len: {h}')
-
-    # some useful octagon properties
-    # https://mathworld.wolfram.com/RegularOctagon.html
-    scoop_thickness = (1. / 12.) * .3048
-    a_scoop = 2. * r_scoop / np.sqrt(4. + 2. * np.sqrt(2.)) # octagon side length
-    inradius = 0.5 * (1. + np.sqrt(2.)) * a_scoop # octagon normal height
-    side_halfangle = np.arctan(a_scoop / (2. * inradius))
-    midpoint_x = inradius * np.cos(2. * side_halfangle)
-    midpoint_y = inradius * np.sin(2. * side_halfangle)
-    vertex_y = r_scoop * np.sin(side_halfangle)
-
-    scoop_inside = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_scoop, height=h+1e-3, resolution=8, split=1)
-    scoop_outside = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_scoop+scoop_thickness, height=h, resolution=8, split=1)
-    scoop = scoop_outside.boolean_difference(scoop_inside)
-    scoop.translate([0, 0, h/2])
-    scoop = o3d.t.geometry.TriangleMesh.to_legacy(scoop)
-    R = scoop.get_rotation_matrix_from_axis_angle([0, 0, (np.pi / 180.) * (360. / 16.)])
-    scoop.rotate(R)
-    scoop = o3d.t.geometry.TriangleMesh.from_legacy(scoop)
-    # rear shield, for sim purposes only
-    # rear_shield = scoop.clone()
-    # rear_shield = rear_shield.clip_plane(point=[0,0,scoop_front-1e-6], normal=[0,0,-1])
-    # rear_shield = rear_shield.clip_plane(point=[0,0,scoop_front/2], normal=[0,0,1])
-    h_shield = h / 4
-    rear_shield_inside = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_scoop, height=h_shield+1e-3, resolution=8, split=1)
-    rear_shield_outside = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_scoop+scoop_thickness, height=h_shield, resolution=8, split=1)
-    rear_shield = rear_shield_outside.boolean_difference(rear_shield_inside)
-    rear_shield.translate([0, 0, -h_shield/2 + .18])
-    rear_shield.compute_vertex_normals()
-    rear_shield.compute_triangle_normals()
-    rear_shield = o3d.t.geometry.TriangleMesh.to_legacy(rear_shield)
-    rear_shield.rotate(R)
-    rear_shield.paint_uniform_color([0.3, 0.3, 0.3])
-    rear_shield.orient_triangles()
-    rear_shield = o3d.t.geometry.TriangleMesh.from_legacy(rear_shield)
-
-    # clip off the front and back faces of the scoop
-    # clip off an angled portion of the scoop
-    scoop_angle = (np.pi / 2.) - min_el
-    y_proj = np.sin(scoop_angle)
-    z_proj = np.cos(scoop_angle)
-    scoop_clip_nhat = [0, y_proj, z_proj]
-    scoop_clip_nhat /= np.linalg.norm(scoop_clip_nhat)
-    scoop_clip_nhat *= -1
-    scoop = scoop.clip_plane(point=[0,-r_scoop,h+1.2-dh], normal=scoop_clip_nhat)
-    # clip off the top to prepare for louvers
-    scoop = scoop.clip_plane(point=[0, vertex_y, 0], normal=[0, -1, 0])
-
-    # color
-    scoop.compute_vertex_normals()
-    scoop.compute_triangle_normals()
-    scoop = o3d.t.geometry.TriangleMesh.to_legacy(scoop)
-    scoop.paint_uniform_color([0.9, 0.9, 0.9])
-    scoop.orient_triangles()
-    scoop = o3d.t.geometry.TriangleMesh.from_legacy(scoop)
 
+def get_louvers(a_scoop, inradius, midpoint_x, midpoint_y,
+                corrugation_angle=corrugation_angle, corrugation_height=corrugation_height):
     # create louvers for top panels
     # corrugation unit cell: bladed rectangular prism
     #  ___________
@@ -196,44 +219,143 @@ def get_geometry():
     pairs = np.array([[0,4], [4,3], [3,2], [2,1], [1,0]]) # order dictates normals
     louver_lineset = o3d.t.geometry.LineSet(pts, pairs)
     louver = louver_lineset.extrude_linear([1, 0, 0], corrugation_width) # fudge some extra length to cover corners on top
-    louver.compute_vertex_normals()
-    louver.compute_triangle_normals()
-    louver = o3d.t.geometry.TriangleMesh.to_legacy(louver)
-    R = louver.get_rotation_matrix_from_axis_angle([-corrugation_angle, 0, 0])
-    louver.rotate(R)
-    louver.paint_uniform_color([0.9, 0.3, 0.9])
-    louver.orient_triangles()
-    louver = o3d.t.geometry.TriangleMesh.from_legacy(louver)
+    rotate_mesh(louver, [-corrugation_angle, 0, 0])
 
     # positioning
     louvers = []
 
     louver_top = louver.clone()
     louver_top.translate([-corrugation_width/2, inradius, .15])
-    louver_top = o3d.t.geometry.TriangleMesh.to_legacy(louver_top)
-    R = louver_top.get_rotation_matrix_from_axis_angle([0, 0, np.pi])
-    louver_top.rotate(R)
-    louver_top = o3d.t.geometry.TriangleMesh.from_legacy(louver_top)
+    rotate_mesh(louver_top, [0, 0, np.pi])
 
     louver_port = louver.clone()
     louver_port.translate([-corrugation_width/2 + midpoint_x, midpoint_y, .15])
-    louver_port = o3d.t.geometry.TriangleMesh.to_legacy(louver_port)
-    R = louver_port.get_rotation_matrix_from_axis_angle([0, 0, np.pi - (np.pi / 180.) * (360. / 8.)])
-    louver_port.rotate(R)
-    louver_port = o3d.t.geometry.TriangleMesh.from_legacy(louver_port)
+    rotate_mesh(louver_port, [0, 0, np.pi - (np.pi / 180.) * (360. / 8.)])
 
     louver_star = louver.clone()
     louver_star.translate([-corrugation_width/2 - midpoint_x, midpoint_y, .15])
-    louver_star = o3d.t.geometry.TriangleMesh.to_legacy(louver_star)
-    R = louver_star.get_rotation_matrix_from_axis_angle([0, 0, np.pi + (np.pi / 180.) * (360. / 8.)])
-    louver_star.rotate(R)
-    louver_star = o3d.t.geometry.TriangleMesh.from_legacy(louver_star)
+    rotate_mesh(louver_star, [0, 0, np.pi + (np.pi / 180.) * (360. / 8.)])
 
     for i in range(N_vanes):
         for lv in [louver_top, louver_port, louver_star]:
             louver_new = lv.clone()
             louver_new.translate([0, 0, i * corrugation_base])
             louvers.append(louver_new)
+    # one mesh, triangle['part'] is 3 * vane + panel (top, port, starboard)
+    return finish_mesh(merge_meshes(louvers), [0.9, 0.3, 0.9])
+
+
+def merge_meshes(meshes):
+    # one mesh holding all of meshes, with the index of the mesh each
+    # triangle came from in triangle['part'], so a group of identical parts
+    # is one geometry in the scene but its parts can still be told apart
+    merged = o3d.t.geometry.TriangleMesh()
+    offsets = np.cumsum([0] + [len(m.vertex['positions']) for m in meshes[:-1]])
+    for k, _ in meshes[0].vertex.items():
+        merged.vertex[k] = o3d.core.Tensor(np.concatenate([m.vertex[k].numpy() for m in meshes]))
+    merged.triangle['indices'] = o3d.core.Tensor(np.concatenate([
+        m.triangle['indices'].numpy() + offset for m, offset in zip(meshes, offsets)
+    ]))
+    for k, _ in meshes[0].triangle.items():
+        if k != 'indices':
+            merged.triangle[k] = o3d.core.Tensor(np.concatenate([m.triangle[k].numpy() for m in meshes]))
+    merged.triangle['part'] = o3d.core.Tensor(np.concatenate([
+        np.full(len(m.triangle['indices']), i, dtype=np.int32) for i, m in enumerate(meshes)
+    ]))
+    return merged
+
+
+def rotate_mesh(mesh, axis_angle, center=None):
+    # rotate mesh in place by the rotation vector axis_angle about center,
+    # by default the vertex mean as legacy TriangleMesh.rotate does, in double
+    # precision; normals are left alone, finish_mesh computes them afterwards
+    v = mesh.vertex['positions'].numpy().astype(np.float64)
+    center = v.mean(axis=0) if center is None else np.asarray(center, dtype=np.float64)
+    R = o3d.geometry.get_rotation_matrix_from_axis_angle(np.asarray(axis_angle, dtype=np.float64))
+    mesh.vertex['positions'] = o3d.core.Tensor((v - center) @ R.T + center)
+    return mesh
+
+
+def finish_mesh(mesh, color):
+    # last step of every mesh builder: float32 vertices and int64 triangles
+    # for the raycasting scene, a uniform color, and normals, computed once
+    # here rather than after every transform
+    mesh.vertex['positions'] = mesh.vertex['positions'].to(o3d.core.float32)
+    mesh.triangle['indices'] = mesh.triangle['indices'].to(o3d.core.int64)
+    n_vertices = len(mesh.vertex['positions'])
+    mesh.vertex['colors'] = o3d.core.Tensor(np.tile(np.float32(color), (n_vertices, 1)))
+    mesh.compute_vertex_normals() # and triangle normals
+    return mesh
+
+
+def get_geometry(config=None):
+    # all units meters, rad
+    # config selects a design variant, see design()
+    d = design(config)
+    BUILD_TIMES.clear()
+    with build_timer('primary'):
+        primary = get_primary(d['mesh_res_factor'])
+    with build_timer('secondary'):
+        secondary = get_secondary(d['mesh_res_factor'])
+    with build_timer('spider'):
+        spider = [get_spider(d['mesh_res_factor'])] if d['spider'] else []
+
+    # scoop
+    # let the scoop be a thin shell, to remain manifold
+    h = 2. * r_out / np.arctan(min_el) + d['dh']
+    print(f'scoop len: {h}')
+
+    # some useful octagon properties
+    # https://mathworld.wolfram.com/RegularOctagon.html
+    scoop_thickness = (1. / 12.) * .3048
+    a_scoop = 2. * r_scoop / np.sqrt(4. + 2. * np.sqrt(2.)) # octagon side length
+    inradius = 0.5 * (1. + np.sqrt(2.)) * a_scoop # octagon normal height
+    side_halfangle = np.arctan(a_scoop / (2. * inradius))
+    midpoint_x = inradius * np.cos(2. * side_halfangle)
+    midpoint_y = inradius * np.sin(2. * side_halfangle)
+    vertex_y = r_scoop * np.sin(side_halfangle)
+
+    with build_timer('scoop'):
+        scoop_inside = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_scoop, height=h+1e-3, resolution=8, split=1)
+        scoop_outside = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_scoop+scoop_thickness, height=h, resolution=8, split=1)
+        scoop = scoop_outside.boolean_difference(scoop_inside)
+        scoop = o3d.t.geometry.TriangleMesh(scoop.vertex['positions'], scoop.triangle['indices']) # drop the boolean op's bookkeeping attributes
+        scoop.translate([0, 0, h/2])
+        rotate_mesh(scoop, [0, 0, (np.pi / 180.) * (360. / 16.)])
+
+        # clip off the front and back faces of the scoop
+        # clip off an angled portion of the scoop
+        scoop_angle = (np.pi / 2.) - min_el
+        y_proj = np.sin(scoop_angle)
+        z_proj = np.cos(scoop_angle)
+        scoop_clip_nhat = [0, y_proj, z_proj]
+        scoop_clip_nhat /= np.linalg.norm(scoop_clip_nhat)
+        scoop_clip_nhat *= -1
+        scoop = scoop.clip_plane(point=[0,-r_scoop,h+1.2-d['dh']], normal=scoop_clip_nhat)
+        # clip off the top to prepare for louvers
+        if d['louvers']:
+            scoop = scoop.clip_plane(point=[0, vertex_y, 0], normal=[0, -1, 0])
+        finish_mesh(scoop, [0.9, 0.9, 0.9])
+
+    with build_timer('rear_shield'):
+        # rear shield, for sim purposes only
+        # rear_shield = scoop.clone()
+        # rear_shield = rear_shield.clip_plane(point=[0,0,scoop_front-1e-6], normal=[0,0,-1])
+        # rear_shield = rear_shield.clip_plane(point=[0,0,scoop_front/2], normal=[0,0,1])
+        h_shield = h / 4
+        rear_shield_inside = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_scoop, height=h_shield+1e-3, resolution=8, split=1)
+        rear_shield_outside = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_scoop+scoop_thickness, height=h_shield, resolution=8, split=1)
+        rear_shield = rear_shield_outside.boolean_difference(rear_shield_inside)
+        rear_shield = o3d.t.geometry.TriangleMesh(rear_shield.vertex['positions'], rear_shield.triangle['indices']) # drop the boolean op's bookkeeping attributes
+        rear_shield.translate([0, 0, -h_shield/2 + .18])
+        rotate_mesh(rear_shield, [0, 0, (np.pi / 180.) * (360. / 16.)])
+        finish_mesh(rear_shield, [0.3, 0.3, 0.3])
+
+    with build_timer('louvers'):
+        louvers = [get_louvers(
+            a_scoop, inradius, midpoint_x, midpoint_y,
+            d['corrugation_angle'], d['corrugation_height']
+        )] if d['louvers'] else []
 
     # create a central baffle
     # h_snoot = .18
@@ -244,35 +366,33 @@ def get_geometry():
     # snoot = snoot.clip_plane(point=[0,0,snoot_front-1e-6], normal=[0,0,-1])
     # snoot = snoot.clip_plane(point=[0,0,snoot_back+1e-6], normal=[0,0,1])
     # # color
-    # snoot = o3d.t.geometry.TriangleMesh.to_legacy(snoot)
-    # snoot.paint_uniform_color([0.8, 0.7, 0.3])
-    # snoot = o3d.t.geometry.TriangleMesh.from_legacy(snoot)
-
-    # a catcher disc: every ray that makes it to this plane is considered naughty, and a no-no
-    cryostat_window = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_in, height=0.05, resolution=50, split=1)
-    cryostat_window.translate([0, 0, -0.3])
-    # color
-    cryostat_window = o3d.t.geometry.TriangleMesh.to_legacy(cryostat_window)
-    cryostat_window.paint_uniform_color([0.9, 0.0, 0.0])
-    cryostat_window = o3d.t.geometry.TriangleMesh.from_legacy(cryostat_window)
+    # snoot = finish_mesh(snoot, [0.8, 0.7, 0.3])
+
+    with build_timer('cryostat_window'):
+        # a catcher disc: every ray that makes it to this plane is considered naughty, and a no-no
+        cryostat_window = o3d.t.geometry.TriangleMesh.create_cylinder(radius=r_in, height=0.05, resolution=50, split=1)
+        cryostat_window.translate([0, 0, -0.3])
+        finish_mesh(cryostat_window, [0.9, 0.0, 0.0])
 
     # TODO: Illinois is designing window 8" x 3" slit
 
-    # prepare meshes for rendering and calculation
+    # every builder leaves its mesh ready for rendering and calculation
     meshes = [scoop, rear_shield, primary, secondary, cryostat_window] + spider + louvers
-    [m.compute_vertex_normals() for m in meshes]
-    [m.compute_triangle_normals() for m in meshes]
 
     absorber_meshes = [cryostat_window, rear_shield]
+    if d['primary_absorber']:
+        absorber_meshes.append(primary)
 
     print('Computing convex hull for incoming rad membership...')
-    system_hull = scoop.compute_convex_hull().boolean_union(primary.compute_convex_hull())
-    system_hull = system_hull.compute_convex_hull()
-    system_hull = o3d.t.geometry.TriangleMesh.from_legacy(
-        system_hull.to_legacy(),
-        vertex_dtype=o3d.core.float32,
-        triangle_dtype=o3d.core.int32
-    )
+    with build_timer('system_hull', stage='hull'):
+        # the hull of the union of the scoop and primary hulls is the hull of
+        # their vertices together, without a boolean union of the two
+        hull_points = np.concatenate([m.vertex['positions'].numpy() for m in [scoop, primary]])
+        system_hull = o3d.t.geometry.PointCloud(o3d.core.Tensor(hull_points)).compute_convex_hull()
+        system_hull = o3d.t.geometry.TriangleMesh(
+            system_hull.vertex['positions'].to(o3d.core.float32),
+            system_hull.triangle['indices'].to(o3d.core.int32)
+        )
 
     mesh_names = [
         'inf',
@@ -281,7 +401,12 @@ def get_geometry():
         'primary',
         'secondary',
         'cryostat_window'
-    ] + [f'spider{i}' for i in range(len(spider))] + [f'louvers{i}' for i in range(len(louvers))]
+    ] + ['spider'] * len(spider) + ['louvers'] * len(louvers)
+
+    for mesh, name in zip(meshes, mesh_names[1:]):
+        set_surface_optics(mesh, name)
+
+    print('Build time: ' + ', '.join(f'{k} {v:.2f} s' for k, v in BUILD_TIMES.items()))
 
     # for i, mesh in enumerate(meshes):
         # print('vmanifold?', mesh_names[i], o3d.t.geometry.TriangleMesh.to_legacy(mesh).is_self_intersecting())
@@ -294,4 +419,126 @@ def get_geometry():
     # for i, mesh in enumerate(meshes):
     #     print('self-intersecting?', mesh_names[i], o3d.t.geometry.TriangleMesh.to_legacy(mesh).is_self_intersecting())
 
-    return meshes, mesh_names, absorber_meshes, system_hull
\ No newline at end of file
+    return meshes, mesh_names, absorber_meshes, system_hull
+
+
+def mirror_planes(meshes, tol=1e-5):
+    # the coordinate planes the geometry is mirror symmetric about: 'x' for
+    # x -> -x (the y-z plane), 'y' for y -> -y, if the mirror image of every
+    # vertex of every mesh lies on that mesh's surface, to within tol. Only
+    # the surfaces need to be symmetric, not their triangulation, which
+    # clipping and boolean operations leave lopsided.
+    planes = []
+    for plane, axis in [('x', 0), ('y', 1)]:
+        symmetric = True
+        for mesh in meshes:
+            scene = o3d.t.geometry.RaycastingScene()
+            scene.add_triangles(mesh)
+            mirrored = mesh.vertex['positions'].numpy().copy()
+            mirrored[:, axis] *= -1
+            if scene.compute_distance(o3d.core.Tensor(mirrored)).numpy().max() > tol:
+                symmetric = False
+                break
+        if symmetric:
+            planes.append(plane)
+    return planes
+
+
+def set_surface_optics(mesh, kind):
+    # per-triangle reflectance, absorptance and diffuse fraction of mesh, from
+    # SURFACE_OPTICS[kind]
+    optics = SURFACE_OPTICS[kind]
+    if optics['reflectance'] + optics['absorptance'] > 1:
+        raise ValueError(f'{kind} reflects and absorbs more than all incident power')
+    n_triangles = len(mesh.triangle.indices)
+    for k, v in optics.items():
+        mesh.triangle[k] = o3d.core.Tensor(np.full(n_triangles, v, dtype=np.float32))
+
+
+def quadric_z(r2, z0, R, a):
+    # height of a conic of revolution with vertex height z0, vertex radius of
+    # curvature R and a = 1 + conic constant, at squared radius r2
+    return z0 + r2 / (R + np.sqrt(R**2 - a * r2))
+
+
+def set_quadrics(mesh, sheets):
+    # per-triangle (z0, R, a) of the conic sheet, one of sheets, that each
+    # triangle of mesh was tessellated from, so the tracer can refine hits
+    # on it analytically; NaN for triangles on no sheet (rims, flat faces)
+    v = mesh.vertex['positions'].numpy().astype(np.float64)
+    t = mesh.triangle['indices'].numpy()
+    r2 = v[:, 0]**2 + v[:, 1]**2
+    quadric = np.full((len(t), 3), np.nan, dtype=np.float32)
+    for sheet in sheets:
+        on_sheet = np.abs(v[:, 2] - quadric_z(r2, *sheet)) < 1e-5
+        quadric[on_sheet[t].all(axis=1)] = sheet
+    mesh.triangle['quadric'] = o3d.core.Tensor(quadric)
+
+
+# -----------------------------------------------------------------------------
+# Cache
+# -----------------------------------------------------------------------------
+def design_parameters():
+    # every module-level number, e.g. f, r_in, roc, dh, MESH_RES_FACTOR
+    return {
+        k: float(v) for k, v in sorted(vars(sys.modules[__name__]).items())
+        if isinstance(v, (int, float, np.number)) and not isinstance(v, bool)
+    }
+
+
+def cache_key(config=None):
+    # hash of the design parameters and variant, plus the module source so an
+    # edit to the mesh builders invalidates old caches too
+    params = dict(design_parameters(), **design(config))
+    h = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+    h.update(inspect.getsource(sys.modules[__name__]).encode())
+    return h.hexdigest()[:16]
+
+
+def save_geometry(path, meshes, mesh_names, absorber_meshes, system_hull):
+    arrays = {
+        'mesh_names': np.array(mesh_names),
+        'absorbers': np.array([
+            i for i, m in enumerate(meshes) if any(m is a for a in absorber_meshes)
+        ], dtype=int),
+    }
+    for i, mesh in enumerate(meshes + [system_hull]):
+        for k, v in mesh.vertex.items():
+            arrays[f'{i}/vertex/{k}'] = v.numpy()
+        for k, v in mesh.triangle.items():
+            arrays[f'{i}/triangle/{k}'] = v.numpy()
+    # write then rename, so concurrent readers never see a partial file
+    tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_geometry(path):
+    with np.load(path) as arrays:
+        mesh_names = [str(n) for n in arrays['mesh_names']]
+        absorbers = arrays['absorbers']
+        n_meshes = len(mesh_names) # one name is 'inf', one extra mesh is the hull
+        meshes = [o3d.t.geometry.TriangleMesh() for i in range(n_meshes)]
+        for key in arrays.files:
+            if '/' not in key:
+                continue
+            i, attr, k = key.split('/')
+            getattr(meshes[int(i)], attr)[k] = o3d.core.Tensor(arrays[key])
+    system_hull = meshes.pop()
+    absorber_meshes = [meshes[i] for i in absorbers]
+    return meshes, mesh_names, absorber_meshes, system_hull
+
+
+def cached_geometry(config=None, cache_dir=CACHE_DIR):
+    # get_geometry(config), but loaded from disk if this design was built before
+    path = os.path.join(cache_dir, f'geometry_{cache_key(config)}.npz')
+    if os.path.exists(path):
+        print(f'Loading cached geometry {path}')
+        with timing.stage('io', operation='load_geometry'):
+            return load_geometry(path)
+    geom = get_geometry(config)
+    os.makedirs(cache_dir, exist_ok=True)
+    with timing.stage('io', operation='save_geometry'):
+        save_geometry(path, *geom)
+    print(f'Cached geometry to {path}')
+    return geom
@@ -1,63 +1,80 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import pickle
 
-from ray_sets import RayPath
+from results import ResultStore, fill_unsampled
 
-query_surface = 'cryostat_window'
+# results are read from the sweep's store on disk, so this also works on a
+# sweep that is still running; unfinished cells are blank
+store = ResultStore('sweep_results')
+aa, ee = np.meshgrid(store.az_pts, store.el_pts)
+results_incident, results_problem, N_rays, results_power = store.results()
+designs = store.designs if store.designs is not None else [None]
+if store.settings.get('adaptive'):
+    # adaptive sweeps only sample some cells of their fine grid
+    results_incident = np.array([fill_unsampled(r) for r in results_incident])
+    results_problem = np.array([fill_unsampled(r) for r in results_problem])
+    N_rays = np.array([fill_unsampled(r) for r in N_rays])
+    results_power = np.array([fill_unsampled(r) for r in results_power])
+query_surface = store.settings['query_surface']
 
-with open('paths.pickle', 'rb') as f:
-    paths = pickle.load(f)
-with open('azs.pickle', 'rb') as f:
-    aa = pickle.load(f)
-with open('els.pickle', 'rb') as f:
-    ee = pickle.load(f)
-with open('results_incident.pickle', 'rb') as f:
-    results_incident = pickle.load(f)
-with open('results_problem.pickle', 'rb') as f:
-    results_problem = pickle.load(f)
-N_rays = len(paths)
 
-
-fig, ax = plt.subplots(ncols=2, nrows=2)
-ax = ax.flatten()
-im = ax[0].pcolormesh(
-    aa * 180. / np.pi,
-    ee * 180. / np.pi,
-    results_incident / N_rays,
-    cmap='bone'
-)
-plt.colorbar(im, ax=ax[0])
-im = ax[1].pcolormesh(
-    aa * 180. / np.pi,
-    ee * 180. / np.pi,
-    (results_problem / results_incident),
-    vmax=0.1,
-    cmap='turbo'
-)
-plt.colorbar(im, ax=ax[1])
-im = ax[2].pcolormesh(
-    aa * 180. / np.pi,
-    ee * 180. / np.pi,
-    np.log10(results_incident / N_rays),
-    cmap='bone'
-)
-plt.colorbar(im, ax=ax[2])
-im = ax[3].pcolormesh(
-    aa * 180. / np.pi,
-    ee * 180. / np.pi,
-    np.log10(results_problem / results_incident),
-    cmap='turbo'
-)
-plt.colorbar(im, ax=ax[3])
-[a.axhline(-20, linestyle='--', color='silver', label='Relative Horizon @ Min. El.') for a in ax]
-[a.scatter(90, 0, s=50, alpha=0.5, marker='o', color='silver', label='Boresight') for a in ax]
-ax[0].legend(loc='lower left')
-[ax[i].set_title(s) for i,s in enumerate(['Incident Fraction', 'Problematic Hit Fraction'] * 2)]
-# [a.set_aspect('equal') for a in ax]
-[a.set_xlabel('Az') for a in ax]
-[a.set_ylabel('El') for a in ax]
-fig.suptitle(query_surface)
-fig.tight_layout()
-plt.show()
+for k, design in enumerate(designs):
+    fig, ax = plt.subplots(ncols=3, nrows=2)
+    # linear maps on top, log below; power in the last column
+    ax = np.concatenate([ax[:, :2].flatten(), ax[:, 2]])
+    im = ax[0].pcolormesh(
+        aa * 180. / np.pi,
+        ee * 180. / np.pi,
+        results_incident[k] / N_rays[k],
+        cmap='bone'
+    )
+    plt.colorbar(im, ax=ax[0])
+    im = ax[1].pcolormesh(
+        aa * 180. / np.pi,
+        ee * 180. / np.pi,
+        (results_problem[k] / results_incident[k]),
+        vmax=0.1,
+        cmap='turbo'
+    )
+    plt.colorbar(im, ax=ax[1])
+    im = ax[2].pcolormesh(
+        aa * 180. / np.pi,
+        ee * 180. / np.pi,
+        np.log10(results_incident[k] / N_rays[k]),
+        cmap='bone'
+    )
+    plt.colorbar(im, ax=ax[2])
+    im = ax[3].pcolormesh(
+        aa * 180. / np.pi,
+        ee * 180. / np.pi,
+        np.log10(results_problem[k] / results_incident[k]),
+        cmap='turbo'
+    )
+    plt.colorbar(im, ax=ax[3])
+    # power reaching the query surface, per unit launched, after the losses
+    # at every reflection (see geometry.SURFACE_OPTICS)
+    im = ax[4].pcolormesh(
+        aa * 180. / np.pi,
+        ee * 180. / np.pi,
+        results_power[k] / N_rays[k],
+        cmap='inferno'
+    )
+    plt.colorbar(im, ax=ax[4])
+    im = ax[5].pcolormesh(
+        aa * 180. / np.pi,
+        ee * 180. / np.pi,
+        np.log10(results_power[k] / N_rays[k]),
+        cmap='inferno'
+    )
+    plt.colorbar(im, ax=ax[5])
+    [a.axhline(-20, linestyle='--', color='silver', label='Relative Horizon @ Min. El.') for a in ax]
+    [a.scatter(90, 0, s=50, alpha=0.5, marker='o', color='silver', label='Boresight') for a in ax]
+    ax[0].legend(loc='lower left')
+    [ax[i].set_title(s) for i,s in enumerate(['Incident Fraction', 'Problematic Hit Fraction'] * 2 + ['Problematic Power Fraction'] * 2)]
+    # [a.set_aspect('equal') for a in ax]
+    [a.set_xlabel('Az') for a in ax]
+    [a.set_ylabel('El') for a in ax]
+    fig.suptitle(query_surface if design is None else f'{design}: {query_surface}')
+    fig.tight_layout()
+    plt.show()
 
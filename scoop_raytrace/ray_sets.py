@@ -1,46 +1,141 @@
 import matplotlib.pyplot as plt
 import numpy as np
+from scipy.spatial import ConvexHull
 from scipy.spatial.transform import Rotation
 
 import open3d as o3d
 
+import timing
 
-class RayPath(object):
-    # an identified list of ray bounces with some properties
-    def __init__(self, id):
-        self.id = id
-        self.rays = []
-        self.n_bounces = 0
-        self.surfaces_hit = []
-        self.last_pos = [np.inf, np.inf, np.inf]
-        self.color = [0.5, 0.5, 0.5]
-        self.lines = []
-        self.incident = False # becomes true first time last_pos is inside system convex hull
-        self.terminated = False
-
-    def ray_to_line(self, start:o3d.core.Tensor, end:o3d.core.Tensor):
-        l = o3d.t.geometry.LineSet(
-            np.vstack([start[u_].numpy(), end[u_].numpy()]),
-            np.array([[0,1]])
+# label position vector u, direction vector v
+u_ = np.s_[0:3] # ray tensor position
+v_ = np.s_[3:] # ray tensor direction
+
+
+# surface id recorded for the launch point of a path, or a miss
+NO_SURFACE = -1
+
+# sides of the polygon standing in for the launch disc when clipping a
+# silhouette to it
+N_DISC_SIDES = 256
+
+# rays per chunk of the streaming generators: a 50-bounce PathStore of one
+# chunk is ~80 MB
+CHUNK_SIZE = 2**16
+
+# every random draw of a run derives from one master seed: each sweep cell,
+# adaptive batch or ray chunk gets its own stream, keyed by its index, and
+# within it the ray bundle and the tracer (roulette, diffuse reflection)
+# draw from separate substreams
+SEED = 77777
+RAYS_STREAM = 0
+TRACE_STREAM = 1
+
+
+def bundle_size(bundle):
+    # number of rays of what a generator returns, (rays, N_rays, ...)
+    return len(bundle[0])
+
+
+def rng_stream(seed, *key):
+    # independent generator number key of seed, the same stream as
+    # SeedSequence(seed).spawn(...)[key[0]].spawn(...)[key[1]]... but found
+    # from the key alone, so it does not depend on what else was spawned, in
+    # which process or in which order
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=tuple(int(k) for k in key)))
+
+
+class PathStore(object):
+    # struct-of-arrays history of a population of ray paths, preallocated for
+    # max_bounces bounces. Row i is path i; entry 0 is the launched ray and
+    # entry j is the ray leaving the j-th surface hit, so the valid part of
+    # path i is rays[i, :n_bounces[i]]. weights[i, j] is the power the ray
+    # carries to entry j, relative to the power it was launched with, and
+    # absorbed[i, j] the part of it the surface of entry j absorbs.
+    def __init__(self, rays, max_bounces):
+        if isinstance(rays, o3d.core.Tensor):
+            rays = rays.numpy()
+        N_rays = rays.shape[0]
+        self.rays = np.full((N_rays, max_bounces + 1, 6), np.nan, dtype=np.float32)
+        self.rays[:, 0] = rays
+        self.surfaces_hit = np.full((N_rays, max_bounces + 1), NO_SURFACE, dtype=np.int32)
+        self.weights = np.full((N_rays, max_bounces + 1), np.nan, dtype=np.float32)
+        self.weights[:, 0] = 1.
+        self.absorbed = np.zeros((N_rays, max_bounces + 1), dtype=np.float32)
+        self.n_bounces = np.ones(N_rays, dtype=np.int32)
+        self.incident = np.zeros(N_rays, dtype=bool) # becomes true first time a ray end is inside system convex hull
+        self.terminated = np.zeros(N_rays, dtype=bool)
+
+    def __len__(self):
+        return self.rays.shape[0]
+
+    @property
+    def max_bounces(self):
+        return self.rays.shape[1] - 1
+
+    def last_rays(self, idx=np.s_[:]):
+        idx = np.arange(len(self))[idx]
+        return self.rays[idx, self.n_bounces[idx] - 1]
+
+    def last_surfaces_hit(self, idx=np.s_[:]):
+        idx = np.arange(len(self))[idx]
+        return self.surfaces_hit[idx, self.n_bounces[idx] - 1]
+
+    def last_weights(self, idx=np.s_[:]):
+        idx = np.arange(len(self))[idx]
+        return self.weights[idx, self.n_bounces[idx] - 1]
+
+    def append(self, idx, ray_end, surf_hit_id, weight, absorbed=0.):
+        # record one more bounce for each of the (unique) paths in idx
+        self.rays[idx, self.n_bounces[idx]] = ray_end
+        self.surfaces_hit[idx, self.n_bounces[idx]] = surf_hit_id
+        self.weights[idx, self.n_bounces[idx]] = weight
+        self.absorbed[idx, self.n_bounces[idx]] = absorbed
+        self.n_bounces[idx] += 1
+
+    def path_surfaces(self, i):
+        return self.surfaces_hit[i, :self.n_bounces[i]]
+
+    def save(self, path):
+        np.savez(
+            path,
+            rays=self.rays,
+            surfaces_hit=self.surfaces_hit,
+            weights=self.weights,
+            absorbed=self.absorbed,
+            n_bounces=self.n_bounces,
+            incident=self.incident,
+            terminated=self.terminated
+        )
+
+    @classmethod
+    def load(cls, path):
+        paths = cls.__new__(cls)
+        with np.load(path) as arrays:
+            for k in arrays.files:
+                setattr(paths, k, arrays[k])
+        if not hasattr(paths, 'absorbed'):
+            # saved before absorption was recorded
+            paths.absorbed = np.zeros(paths.weights.shape, dtype=np.float32)
+        return paths
+
+    def lineset(self, idx=np.s_[:], rgb=(0.5, 0.5, 0.5)):
+        # one LineSet holding every path in idx, a path or an index array or
+        # mask; rgb is one color for all of them or one per path. Built on
+        # request only, e.g. for rendering
+        idx = np.atleast_1d(np.arange(len(self))[idx])
+        valid = np.arange(self.max_bounces + 1) < self.n_bounces[idx, None]
+        # index of each valid ray end among all points, in path order
+        point_idx = (np.cumsum(valid) - 1).reshape(valid.shape)
+        segments = valid[:, 1:] # paths are contiguous, so both ends are valid
+        pairs = np.stack([point_idx[:, :-1][segments], point_idx[:, 1:][segments]], axis=1)
+        rgb = np.broadcast_to(np.asarray(rgb, dtype=np.float64), (len(idx), 3))
+        ls = o3d.geometry.LineSet(
+            o3d.utility.Vector3dVector(self.rays[idx][valid][:, u_].astype(np.float64)),
+            o3d.utility.Vector2iVector(pairs)
         )
-        self.last_pos = end[u_]
-        return l
-
-    def append(self, ray_start, ray_end, surf_hit_id):
-        self.rays.append(ray_end)
-        line = self.ray_to_line(ray_start, ray_end)
-        self.lines.append(line) # TODO: refactor to use LineSet properly
-        self.n_bounces += 1
-        self.surfaces_hit.append(surf_hit_id)
-
-    def apply_color(self, rgb):
-        self.color = rgb
-        colored_lines = []
-        for line in self.lines:
-            ls = o3d.t.geometry.LineSet.to_legacy(line)
-            ls.paint_uniform_color(rgb)
-            colored_lines.append(o3d.t.geometry.LineSet.from_legacy(ls))
-        self.lines = colored_lines
+        ls.colors = o3d.utility.Vector3dVector(np.repeat(rgb, segments.sum(axis=1), axis=0))
+        return ls
 
 
 def simple_fan(radii):
@@ -62,15 +157,17 @@ def simple_fan(radii):
     return rays, N_rays
 
 
-def simple_gaussian():
+def simple_gaussian(rng=None):
     # on-axis, Gaussian bundle, dense
+    if rng is None:
+        rng = np.random.default_rng(seed=SEED)
     h = 10
     N_rays = 500
     rays = o3d.core.Tensor(
         np.zeros((N_rays, 6)),
         dtype=o3d.core.Dtype.Float32
     )
-    xy_coord = np.random.normal(scale=(.35,.35), loc=(0,0), size=(N_rays, 2))
+    xy_coord = rng.normal(scale=(.35,.35), loc=(0,0), size=(N_rays, 2))
     rays[:,0] = xy_coord[:,0]
     rays[:,1] = xy_coord[:,1]
     rays[:,2] = h
@@ -78,60 +175,159 @@ def simple_gaussian():
     return rays, N_rays
 
 
+def ray_array(N_rays):
+    # preallocated (N, 6) bundle, the layout o3d's cast_rays takes
+    return np.empty((N_rays, 6), dtype=np.float32)
+
+
+@timing.timed('rays', n_rays=bundle_size)
 def random_disc(r_max, N_rays, pos, dir, rng=None):
-    if not rng:
-        rng = np.random.default_rng(seed=77777)
+    if rng is None:
+        rng = np.random.default_rng(seed=SEED)
     # inverse transform sampling
     r = r_max * np.sqrt(rng.uniform(size=N_rays))
     theta = rng.uniform(size=N_rays) * 2. * np.pi
-    x = r * np.cos(theta)
-    y = r * np.sin(theta)
-    z = np.zeros_like(x)
+    u = np.zeros((N_rays, 3))
+    u[:, 0] = r * np.cos(theta)
+    u[:, 1] = r * np.sin(theta)
     nhat = [0, 0, 1] # initial normal of the disc of points
-    u = np.vstack([x, y, z]).T
-    v = np.tile(dir, (N_rays, 1))
     R, _ = Rotation.align_vectors(np.atleast_2d(dir), np.atleast_2d(nhat))
-    u = R.apply(u)
-    nhat = R.apply(nhat)
-    u += pos
-    rays = o3d.core.Tensor(
-        np.zeros((N_rays, 6)),
-        dtype=o3d.core.Dtype.Float32
-    )
-    rays[:,0] = u[:,0]
-    rays[:,1] = u[:,1]
-    rays[:,2] = u[:,2]
-    rays[:,3] = v[:,0]
-    rays[:,4] = v[:,1]
-    rays[:,5] = v[:,2]
-    return rays, N_rays
+    rays = ray_array(N_rays)
+    rays[:, u_] = R.apply(u) + pos
+    rays[:, v_] = dir
+    return o3d.core.Tensor.from_numpy(rays), N_rays
+
+
+@timing.timed('rays', n_rays=bundle_size)
+def silhouette_disc(r_max, N_rays, pos, dir, points, rng=None, disc_equivalent=False):
+    # random_disc, but only sampling the part of the disc that can see the
+    # scene: the silhouette of points (e.g. the vertices of the scene's
+    # convex hull, TraceScene.launch_hull) projected along dir onto the
+    # disc, clipped to the disc. A ray launched anywhere else misses
+    # everything. Also returns area_weight, the silhouette's share of the
+    # disc area: a count out of these N_rays is a count out of
+    # N_rays / area_weight rays launched across the whole disc. If
+    # disc_equivalent, N_rays counts rays across the whole disc instead, and
+    # only its share inside the silhouette, rounded up, is launched.
+    if rng is None:
+        rng = np.random.default_rng(seed=SEED)
+    R, _ = Rotation.align_vectors(np.atleast_2d(dir), np.atleast_2d([0, 0, 1]))
+    # in-plane coordinates of the disc, as random_disc lays it out
+    basis = R.apply(np.eye(3)[:2])
+    points_2d = (np.asarray(points) - pos) @ basis.T
+    polygon = points_2d[ConvexHull(points_2d).vertices]
+    inradius = r_max * np.cos(np.pi / N_DISC_SIDES)
+    if np.any(np.linalg.norm(polygon, axis=1) > inradius):
+        angle = np.linspace(0, 2. * np.pi, N_DISC_SIDES, endpoint=False)
+        disc = r_max * np.vstack([np.cos(angle), np.sin(angle)]).T
+        polygon = clip_convex_polygon(disc, polygon)
+    area_weight = polygon_area(polygon) / (np.pi * r_max**2) if len(polygon) > 2 else 0.
+    if disc_equivalent:
+        N_rays = int(np.ceil(N_rays * area_weight))
+    if area_weight == 0:
+        N_rays = 0
+    rays = ray_array(N_rays)
+    rays[:, u_] = sample_polygon(polygon, N_rays, rng) @ basis + pos
+    rays[:, v_] = dir
+    return o3d.core.Tensor.from_numpy(rays), N_rays, area_weight
+
+
+def polygon_area(polygon):
+    # of a counter-clockwise polygon, by the shoelace formula
+    x, y = polygon.T
+    return 0.5 * np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)
+
+
+def clip_convex_polygon(subject, clip):
+    # Sutherland-Hodgman: the part of convex polygon subject inside convex
+    # polygon clip, both counter-clockwise, one clip edge at a time
+    for a, b in zip(clip, np.roll(clip, -1, axis=0)):
+        if len(subject) == 0:
+            break
+        edge = b - a
+        # > 0 inside, left of the edge
+        side = edge[0] * (subject[:, 1] - a[1]) - edge[1] * (subject[:, 0] - a[0])
+        side_nxt = np.roll(side, -1)
+        keep = side >= 0
+        # each vertex is followed by the crossing of its outgoing side, if any
+        crossing = keep != (side_nxt >= 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = side / (side - side_nxt)
+            crossings = subject + (np.roll(subject, -1, axis=0) - subject) * t[:, None]
+        subject = np.stack([subject, crossings], axis=1)[np.stack([keep, crossing], axis=1)]
+    return subject
 
 
-def random_omnidirectional():
-    earth_limb_angle = (-20. + np.linspace(0, 6, num=2001, endpoint=True)) * np.pi / 180.
+def sample_polygon(polygon, N_rays, rng):
+    # uniform points in a convex polygon: pick triangles of its fan by area,
+    # then a uniform point in each triangle
+    if N_rays == 0:
+        return np.zeros((0, 2))
+    a = polygon[0]
+    b = polygon[1:-1]
+    c = polygon[2:]
+    area = 0.5 * np.abs(np.cross(b - a, c - a))
+    tri = rng.choice(len(area), size=N_rays, p=area / area.sum())
+    r1 = np.sqrt(rng.uniform(size=(N_rays, 1)))
+    r2 = rng.uniform(size=(N_rays, 1))
+    return (1 - r1) * a + r1 * (1 - r2) * b[tri] + r1 * r2 * c[tri]
+
+
+@timing.timed('rays', n_rays=bundle_size)
+def random_omnidirectional(N_side=2001, rng=None):
+    # a grid of origins looking up at the Earth limb, each with a random
+    # direction
+    if rng is None:
+        rng = np.random.default_rng(seed=SEED)
+    earth_limb_angle = (-20. + np.linspace(0, 6, num=N_side, endpoint=True)) * np.pi / 180.
     ray_z = 10
     ray_ys = ray_z * np.tan(earth_limb_angle)
-    ray_xs = np.linspace(-4, 4, num=2001, endpoint=True)
-    XX, YY = np.meshgrid(ray_xs, ray_ys)
-    xflat = XX.flatten()
-    yflat = YY.flatten()
-    rng = np.random.default_rng(seed=77777)
-    v = rng.normal(size=(len(xflat), 3))
-    vhat = v / np.linalg.norm(v)
-    assert(len(xflat) == len(yflat))
-    N_rays = vhat.shape[0]
-    rays = o3d.core.Tensor(
-        np.zeros((N_rays, 6)),
-        dtype=o3d.core.Dtype.Float32
-    )
-    rays[:,0] = xflat
-    rays[:,1] = yflat
-    rays[:,2] = ray_z
-    rays[:,3:] = vhat
-    return rays, N_rays
+    ray_xs = np.linspace(-4, 4, num=N_side, endpoint=True)
+    N_rays = N_side * N_side
+    rays = ray_array(N_rays)
+    # x varies fastest, as in a flattened meshgrid
+    rays[:, 0] = np.tile(ray_xs, N_side)
+    rays[:, 1] = np.repeat(ray_ys, N_side)
+    rays[:, 2] = ray_z
+    v = rng.normal(size=(N_rays, 3))
+    rays[:, v_] = v / np.linalg.norm(v, axis=1, keepdims=True)
+    return o3d.core.Tensor.from_numpy(rays), N_rays
+
+
+def random_disc_chunks(r_max, N_rays, pos, dir, chunk_size=CHUNK_SIZE, seed=SEED):
+    # random_disc as a stream of (chunk_size, 6) arrays, chunk i drawn from
+    # its own random stream, so any chunk can be regenerated on its own
+    for i_chunk, start in enumerate(range(0, N_rays, chunk_size)):
+        rng = rng_stream(seed, i_chunk, RAYS_STREAM)
+        rays, _ = random_disc(r_max, min(chunk_size, N_rays - start), pos, dir, rng=rng)
+        yield rays.numpy()
+
+
+def random_omnidirectional_chunks(N_side=2001, chunk_size=CHUNK_SIZE, seed=SEED):
+    # random_omnidirectional as a stream of (chunk_size, 6) arrays, without
+    # ever building the whole grid; chunk i draws its directions from its own
+    # random stream
+    earth_limb_angle = (-20. + np.linspace(0, 6, num=N_side, endpoint=True)) * np.pi / 180.
+    ray_z = 10
+    ray_ys = ray_z * np.tan(earth_limb_angle)
+    ray_xs = np.linspace(-4, 4, num=N_side, endpoint=True)
+    N_rays = N_side * N_side
+    for i_chunk, start in enumerate(range(0, N_rays, chunk_size)):
+        with timing.stage('rays', n_rays=min(chunk_size, N_rays - start)):
+            rng = rng_stream(seed, i_chunk, RAYS_STREAM)
+            idx = np.arange(start, min(start + chunk_size, N_rays))
+            rays = ray_array(len(idx))
+            rays[:, 0] = ray_xs[idx % N_side]
+            rays[:, 1] = ray_ys[idx // N_side]
+            rays[:, 2] = ray_z
+            v = rng.normal(size=(len(idx), 3))
+            rays[:, v_] = v / np.linalg.norm(v, axis=1, keepdims=True)
+        yield rays
 
 
-def angular_sector():
+@timing.timed('rays', n_rays=bundle_size)
+def angular_sector(N_origins=20, N_bundle_side=10, theta_half_angle=np.pi/8,
+                   phi_half_angle=np.pi/8):
     # focused range of angles
     # set up a grid of origin points in relevant angular ranges
     # the nominal lowest el is +20, and Earth limb may become important by +6.
@@ -139,41 +335,28 @@ def angular_sector():
     earth_limb_angle = (-20. + np.linspace(0, .1, num=1, endpoint=True)) * np.pi / 180.
     ray_z = 10
     ray_ys = ray_z * np.tan(earth_limb_angle)
-    ray_xs = np.linspace(-10, 10, num=20, endpoint=True)
+    ray_xs = np.linspace(-10, 10, num=N_origins, endpoint=True)
     XX, YY = np.meshgrid(ray_xs, ray_ys)
-    xflat = XX.flatten()
-    yflat = YY.flatten()
-    ray_bundle_origin = np.vstack([xflat, yflat, np.ones_like(xflat) * ray_z]).T
+    ray_bundle_origin = np.vstack([XX.flatten(), YY.flatten(), np.full(XX.size, ray_z)]).T
     aimpoint = np.array([0, 0, 0]).T
     v_aim = aimpoint - ray_bundle_origin
     v_aim /= np.atleast_2d(np.linalg.norm(v_aim, axis=1)).T
 
-    # shoot a bundle of rays, each rotated by a small amount relative to the main
-    # aim vector
-    theta_half_angle = np.pi/8
-    phi_half_angle = np.pi/8
-    N_bundle_side = 10
+    # shoot a bundle of rays from each origin, each rotated by a small amount
+    # relative to the main aim vector: one set of rotation matrices, applied
+    # to every origin's aim vector at once
     thetas = np.linspace(-theta_half_angle, theta_half_angle, num=N_bundle_side)
     phis = np.linspace(-phi_half_angle, phi_half_angle, num=N_bundle_side)
-    ray_list = []
-    for i in range(len(xflat)):
-        print(f'{(i+1) / len(xflat):.2f}', end='\r')
-        ddtheta, ddphi = np.meshgrid(thetas, phis)
-        dtheta = ddtheta.flatten()
-        dphi = ddphi.flatten()
-        rots = Rotation.from_euler('YXZ', np.vstack([dtheta, dphi, np.zeros_like(dphi)]).T)
-        for rot in rots:
-            v_aim_new = rot.apply(v_aim[i,:])
-            # add the bundle of rays to the total list
-            this_ray = [xflat[i], yflat[i], ray_z, v_aim_new[0], v_aim_new[1], v_aim_new[2]]
-            ray_list.append(this_ray)
-
-    rays = o3d.core.Tensor(
-        ray_list,
-        dtype=o3d.core.Dtype.Float32
-    )
-    N_rays = rays.numpy().shape[0]
-    return rays, N_rays
+    ddtheta, ddphi = np.meshgrid(thetas, phis)
+    dtheta = ddtheta.flatten()
+    dphi = ddphi.flatten()
+    rots = Rotation.from_euler('YXZ', np.vstack([dtheta, dphi, np.zeros_like(dphi)]).T)
+    N_origins, N_bundle = len(ray_bundle_origin), len(rots)
+    rays = ray_array(N_origins * N_bundle).reshape(N_origins, N_bundle, 6)
+    rays[:, :, u_] = ray_bundle_origin[:, None]
+    rays[:, :, v_] = np.einsum('bij,oj->obi', rots.as_matrix(), v_aim)
+    rays = rays.reshape(-1, 6)
+    return o3d.core.Tensor.from_numpy(rays), len(rays)
 
 
 def plot_rays(u, v):
@@ -0,0 +1,54 @@
+import matplotlib.pyplot as plt
+
+import geometry
+import ray_sets
+import timing
+import tracer
+
+# the omnidirectional Earth-limb case is ~4M rays: they are generated and
+# traced one chunk at a time and reduced into running statistics, so memory
+# stays flat however large the grid
+N_side = 2001 # origins per side of the launch grid
+chunk_size = ray_sets.CHUNK_SIZE
+N_bounces = 50
+max_consecutive_hits = 3 # indicates a ray may be trapped inside a mesh
+min_weight = 0.1 # Russian roulette below this ray power
+
+design = None # a design variant from geometry.DESIGNS, or None for the default
+# time per pipeline stage is appended here as JSON lines, see timing.py
+timing_log = 'timing.jsonl'
+
+if timing_log is not None:
+    timing.start_log(timing_log)
+print('Creating meshes...')
+tscene = tracer.TraceScene(*geometry.cached_geometry(design))
+
+print('Tracing rays...')
+chunks = ray_sets.random_omnidirectional_chunks(N_side, chunk_size=chunk_size)
+stats = tracer.trace_chunks(
+    tscene,
+    chunks,
+    N_bounces,
+    max_consecutive_hits,
+    check_incident=True,
+    min_weight=min_weight
+)
+print(f'{stats.N_incident} of {stats.N_rays} rays entered the system hull')
+print(stats.summary(tscene.mesh_id_to_name))
+print(timing.summary())
+
+# fraction of rays, and of power, per last hit surface
+surf_ids = stats.surface_ids()
+ray_fraction, power_fraction = stats.last_hit_fractions()
+fig, ax = plt.subplots()
+ax.bar(surf_ids, ray_fraction, label='rays')
+ax.scatter(surf_ids, power_fraction, color='k', label='power', zorder=2)
+ax.set_yscale('log')
+ax.set_xticks(surf_ids)
+ax.set_xticklabels([tscene.mesh_id_to_name[i] for i in surf_ids], rotation=90)
+ax.set_title('Ray Fates')
+ax.set_xlabel('ID of Last Surface')
+ax.set_ylabel('Fraction of Total Casted Rays')
+ax.legend()
+fig.tight_layout()
+plt.show()
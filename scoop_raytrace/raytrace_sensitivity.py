@@ -0,0 +1,54 @@
+import numpy as np
+
+import sweep
+import timing
+
+# a coarser grid than raytrace_quadrant.py, with more rays per cell, as every
+# cell is traced once per design
+az_pts = np.arange(-45, 46, 5) * np.pi / 180. + np.pi/2
+el_pts = np.arange(-45, 90, 5) * np.pi / 180.
+symmetry = 'auto'
+
+# every combination of these values is swept, on top of the base design (see
+# geometry.design(), e.g. 'evans_design'); the scoop and louvers are rebuilt
+# for each, the mirrors are shared
+parameters = dict(
+    dh=[-1.5, -1.25, -1., 0.], # shorten the scoop?
+    corrugation_angle=np.array([20., 27.6, 35.]) * np.pi / 180., # louver vane angle
+    corrugation_height=np.array([2., 3.]) / 12. * .3048, # louver vane depth
+)
+base = None
+
+settings = dict(
+    N_rays=30, # rays per (az, el) cell
+    r_disc=3., # radius of the launched disc of rays
+    silhouette=True, # only launch from where the disc can see the scene
+    N_bounces=3,
+    max_consecutive_hits=10, # indicates a ray may be trapped inside a mesh
+    min_weight=0., # Russian roulette below this ray power, 0 to trace all
+    analytic_mirrors=False, # exact mirror surfaces, e.g. with a low MESH_RES_FACTOR
+    query_surface='cryostat_window',
+)
+n_workers = None # one process per core
+# each cell is written here as it finishes; rerun to resume an interrupted
+# sweep. The table of problem fractions is written here too.
+out_dir = 'sensitivity_results'
+# time per pipeline stage, see timing.py
+timing_log = 'timing.jsonl'
+
+
+if __name__ == '__main__':
+    if timing_log is not None:
+        timing.start_log(timing_log)
+    print('Tracing rays...')
+    sweep.run_sensitivity(
+        az_pts,
+        el_pts,
+        parameters,
+        base=base,
+        n_workers=n_workers,
+        out_dir=out_dir,
+        symmetry=symmetry,
+        **settings
+    )
+    print(timing.summary())
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+
+import open3d as o3d
+
+import timing
+from ray_sets import NO_SURFACE
+
+# off-screen camera views, (eye, lookat, up) in meters: looking down on the
+# scoop from the side, and into its mouth along the boresight
+VIEWS = {
+    'side': ([12., 0., 3.], [0., 0., 2.], [0., 0., 1.]),
+    'front': ([0., -6., 10.], [0., 0., 1.5], [0., 0., 1.]),
+}
+
+
+def select_paths(paths, tscene, fate=None, max_paths=None, rng=None):
+    # indices of the paths to draw: those whose last surface hit is fate, a
+    # surface name or list of names ('inf' for escaped rays), or all of
+    # them, randomly subsampled down to max_paths
+    idx = np.arange(len(paths))
+    if fate is not None:
+        fate = [fate] if isinstance(fate, str) else fate
+        fate_ids = [NO_SURFACE if name == 'inf' else tscene.mesh_id(name) for name in fate]
+        idx = idx[np.isin(paths.last_surfaces_hit(), fate_ids)]
+    if max_paths is not None and len(idx) > max_paths:
+        if rng is None:
+            rng = np.random.default_rng()
+        idx = np.sort(rng.choice(idx, size=max_paths, replace=False))
+    return idx
+
+
+def path_lineset(paths, tscene, fate=None, max_paths=None, rng=None):
+    # one LineSet of the selected paths, each colored by the last surface hit
+    idx = select_paths(paths, tscene, fate, max_paths, rng)
+    last = paths.last_surfaces_hit(idx)
+    surf_ids, inverse = np.unique(last, return_inverse=True)
+    colors = np.array([tscene.mesh_color(i) for i in surf_ids]).reshape(-1, 3)
+    print(f'Drawing {len(idx)} of {len(paths)} paths')
+    return paths.lineset(idx, colors[inverse])
+
+
+def write_ply(path, lineset):
+    # for later viewing, e.g. o3d.visualization.draw_geometries or MeshLab
+    with timing.stage('io', operation='write_ply'):
+        o3d.io.write_line_set(path, lineset)
+
+
+def render_png(out_dir, meshes, lineset, views=VIEWS, width=1600, height=1200, fov=45.):
+    # render meshes and paths off-screen, one PNG per view, without a window,
+    # e.g. on a compute node. Needs an Open3D build with headless (EGL)
+    # rendering support.
+    renderer = o3d.visualization.rendering.OffscreenRenderer(width, height)
+    renderer.scene.set_background([1., 1., 1., 1.])
+    mesh_material = o3d.visualization.rendering.MaterialRecord()
+    mesh_material.shader = 'defaultLit'
+    line_material = o3d.visualization.rendering.MaterialRecord()
+    line_material.shader = 'unlitLine'
+    line_material.line_width = 1.
+    for i, mesh in enumerate(meshes):
+        renderer.scene.add_geometry(f'mesh_{i}', mesh, mesh_material)
+    renderer.scene.add_geometry('paths', lineset, line_material)
+    os.makedirs(out_dir, exist_ok=True)
+    for name, (eye, lookat, up) in views.items():
+        renderer.setup_camera(fov, lookat, eye, up)
+        with timing.stage('io', operation='render_png', view=name):
+            o3d.io.write_image(os.path.join(out_dir, f'{name}.png'), renderer.render_to_image())
@@ -0,0 +1,114 @@
+import json
+import os
+
+import numpy as np
+from scipy.interpolate import NearestNDInterpolator
+
+import timing
+from ray_sets import PathStore
+
+
+class ResultStore(object):
+    # sweep results on disk, one small shard per (az, el) cell, written as
+    # each cell finishes so a sweep can be resumed after a crash and read
+    # back while it is still running:
+    #   meta.json           grid, designs and trace settings of the sweep
+    #   cells/EEEE_AAAA.npy (n_designs, 4) incident, problem and launched ray
+    #                       counts, and the power the problem rays carry to
+    #                       the query surface
+    #   paths/EEEE_AAAA_K.npz PathStore of design K, if paths are saved
+    def __init__(self, path, az_pts=None, el_pts=None, designs=None, settings=None):
+        # open an existing store with just a path; given a grid, create the
+        # store or check that it holds the same sweep before resuming it
+        self.path = path
+        meta_path = os.path.join(path, 'meta.json')
+        if az_pts is None:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        else:
+            meta = dict(
+                az_pts=[float(az) for az in az_pts],
+                el_pts=[float(el) for el in el_pts],
+                designs=designs,
+                settings=settings or {},
+            )
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    stored_meta = json.load(f)
+                if stored_meta != json.loads(json.dumps(meta)):
+                    raise ValueError(
+                        f'{path} holds results of a different sweep, ' +
+                        'choose another directory to start a new one'
+                    )
+            else:
+                os.makedirs(os.path.join(path, 'cells'), exist_ok=True)
+                os.makedirs(os.path.join(path, 'paths'), exist_ok=True)
+                with open(meta_path, 'w') as f:
+                    json.dump(meta, f, indent=1)
+        self.az_pts = np.array(meta['az_pts'])
+        self.el_pts = np.array(meta['el_pts'])
+        self.designs = meta['designs']
+        self.settings = meta['settings']
+        self.n_designs = 1 if self.designs is None else len(self.designs)
+
+    @property
+    def shape(self):
+        # (el, az) grid shape, as the result maps are indexed
+        return len(self.el_pts), len(self.az_pts)
+
+    def _cell_file(self, ie, ia):
+        return os.path.join(self.path, 'cells', f'{ie:04d}_{ia:04d}.npy')
+
+    def _paths_file(self, ie, ia, k):
+        return os.path.join(self.path, 'paths', f'{ie:04d}_{ia:04d}_{k}.npz')
+
+    def finished_cells(self):
+        # flat (el, az) indices of every cell with results on disk
+        finished = []
+        for name in os.listdir(os.path.join(self.path, 'cells')):
+            if name.endswith('.npy'):
+                ie, ia = name[:-len('.npy')].split('_')
+                finished.append(np.ravel_multi_index((int(ie), int(ia)), self.shape))
+        return sorted(finished)
+
+    def write_cell(self, ie, ia, counts, paths=None):
+        with timing.stage('io', operation='write_cell'):
+            # paths first, so a cell is only marked finished once complete;
+            # write then rename, so readers never see a partial file
+            for k, cell_paths in enumerate(paths or []):
+                tmp_path = self._paths_file(ie, ia, k) + '.tmp.npz'
+                cell_paths.save(tmp_path)
+                os.replace(tmp_path, self._paths_file(ie, ia, k))
+            tmp_path = self._cell_file(ie, ia) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.asarray(counts, dtype=float))
+            os.replace(tmp_path, self._cell_file(ie, ia))
+
+    def read_cell(self, ie, ia):
+        return np.load(self._cell_file(ie, ia))
+
+    def results(self):
+        # results_incident, results_problem, the number of rays launched and
+        # results_power per cell, with a leading design axis, NaN where a
+        # cell has not finished
+        results = np.full((self.n_designs, 4) + self.shape, np.nan)
+        for idx in self.finished_cells():
+            ie, ia = np.unravel_index(idx, self.shape)
+            results[:, :, ie, ia] = self.read_cell(ie, ia)
+        return results[:, 0], results[:, 1], results[:, 2], results[:, 3]
+
+    def cell_paths(self, ie, ia, k=0):
+        # paths of one cell and design, loaded on demand
+        return PathStore.load(self._paths_file(ie, ia, k))
+
+
+def fill_unsampled(values):
+    # fill NaN cells of a map from the nearest sampled cell, e.g. to display
+    # the sparse maps of an adaptive sweep
+    sampled = np.isfinite(values)
+    if sampled.all() or not sampled.any():
+        return values
+    interp = NearestNDInterpolator(np.argwhere(sampled), values[sampled])
+    filled = values.copy()
+    filled[~sampled] = interp(np.argwhere(~sampled))
+    return filled
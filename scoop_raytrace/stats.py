@@ -0,0 +1,171 @@
+import numpy as np
+
+import timing
+from ray_sets import NO_SURFACE
+
+
+def wilson_interval(k, n, z=1.96):
+    # binomial confidence interval on k successes in n trials; (0, 1) if n == 0
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = k / n
+        center = (p + z**2 / (2 * n)) / (1 + z**2 / n)
+        half_width = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / (1 + z**2 / n)
+    lo = np.where(n > 0, center - half_width, 0.)
+    hi = np.where(n > 0, center + half_width, 1.)
+    return lo, hi
+
+
+def needs_rays(incident, problem, launched, target_ci):
+    # a cell's incident fraction, or problem fraction of its incident rays,
+    # is not yet known to within +/- target_ci
+    lo, hi = wilson_interval(incident, launched)
+    wide = (hi - lo) / 2 > target_ci
+    lo, hi = wilson_interval(problem, incident)
+    wide |= (incident > 0) & ((hi - lo) / 2 > target_ci)
+    return wide
+
+
+class RunningStats(object):
+    # tallies of traced paths, accumulated one chunk of paths at a time so
+    # that memory stays flat however many rays are traced. Per-surface
+    # arrays are indexed by surface id - NO_SURFACE, so index 0 holds rays
+    # that escaped without hitting anything (or, in hit_counts, escapes).
+    #   first_last_counts[i, j]  paths first hitting surface i, ending on j
+    #   first_last_power[i, j]   the power those paths carry to j
+    #   hit_counts[i]            hits on surface i over every bounce
+    #   absorbed_power[i]        the power surface i absorbs over every
+    #                            bounce, by its absorptance
+    #   bounce_counts[n]         paths with n hits, escape included
+    def __init__(self, n_surfaces):
+        self.N_rays = 0
+        self.N_incident = 0
+        self.first_last_counts = np.zeros((n_surfaces + 1, n_surfaces + 1), dtype=np.int64)
+        self.first_last_power = np.zeros((n_surfaces + 1, n_surfaces + 1))
+        self.hit_counts = np.zeros(n_surfaces + 1, dtype=np.int64)
+        self.absorbed_power = np.zeros(n_surfaces + 1)
+        self.bounce_counts = np.zeros(1, dtype=np.int64)
+
+    @property
+    def n_surfaces(self):
+        return len(self.hit_counts) - 1
+
+    @property
+    def last_hit_counts(self):
+        return self.first_last_counts.sum(axis=0)
+
+    @property
+    def last_hit_power(self):
+        return self.first_last_power.sum(axis=0)
+
+    @property
+    def first_hit_counts(self):
+        return self.first_last_counts.sum(axis=1)
+
+    def add(self, paths):
+        # reduce one PathStore into the tallies
+        with timing.stage('stats', n_rays=len(paths)):
+            n = self.n_surfaces + 1
+            first = paths.surfaces_hit[:, min(1, paths.max_bounces)] - NO_SURFACE
+            last = paths.last_surfaces_hit() - NO_SURFACE
+            first_last = first * n + last
+            self.N_rays += len(paths)
+            self.N_incident += int(np.sum(paths.incident))
+            self.first_last_counts += np.bincount(first_last, minlength=n * n).reshape(n, n)
+            self.first_last_power += np.bincount(
+                first_last,
+                weights=paths.last_weights(),
+                minlength=n * n
+            ).reshape(n, n)
+            hits = np.arange(paths.max_bounces + 1) < paths.n_bounces[:, None]
+            hits[:, 0] = False # the launch point
+            self.hit_counts += np.bincount(paths.surfaces_hit[hits] - NO_SURFACE, minlength=n)
+            self.absorbed_power += np.bincount(
+                paths.surfaces_hit[hits] - NO_SURFACE,
+                weights=paths.absorbed[hits],
+                minlength=n
+            )
+            self.add_bounce_counts(np.bincount(paths.n_bounces - 1))
+        return self
+
+    def add_bounce_counts(self, counts):
+        if len(counts) > len(self.bounce_counts):
+            self.bounce_counts = np.pad(self.bounce_counts, (0, len(counts) - len(self.bounce_counts)))
+        self.bounce_counts[:len(counts)] += counts
+
+    def merge(self, other):
+        # fold in the tallies of another run, e.g. from another process
+        self.N_rays += other.N_rays
+        self.N_incident += other.N_incident
+        self.first_last_counts += other.first_last_counts
+        self.first_last_power += other.first_last_power
+        self.hit_counts += other.hit_counts
+        self.absorbed_power += other.absorbed_power
+        self.add_bounce_counts(other.bounce_counts)
+        return self
+
+    def surface_ids(self):
+        return np.arange(self.n_surfaces + 1) + NO_SURFACE
+
+    def last_hit_fractions(self):
+        # fraction of rays, and of launched power, ending on each surface
+        return self.last_hit_counts / self.N_rays, self.last_hit_power / self.N_rays
+
+    def last_hit_intervals(self, z=1.96):
+        # Wilson interval on the fraction of rays ending on each surface
+        return wilson_interval(self.last_hit_counts, self.N_rays, z)
+
+    def absorbed_fractions(self):
+        # fraction of launched power each surface absorbs
+        return self.absorbed_power / max(self.N_rays, 1)
+
+    def bounce_distribution(self):
+        # fraction of paths by number of hits
+        return self.bounce_counts / max(self.N_rays, 1)
+
+    def incident_fraction(self, z=1.96):
+        # fraction of launched rays entering the system hull, and its interval
+        lo, hi = wilson_interval(self.N_incident, self.N_rays, z)
+        return self.N_incident / max(self.N_rays, 1), lo, hi
+
+    def problem_fraction(self, surface_id, z=1.96):
+        # fraction of incident rays ending on surface_id, e.g. the cryostat
+        # window, and its interval
+        N_problem = self.last_hit_counts[surface_id - NO_SURFACE]
+        lo, hi = wilson_interval(N_problem, self.N_incident, z)
+        return N_problem / max(self.N_incident, 1), lo, hi
+
+    def cell_counts(self, surface_id):
+        # incident, problem and launched ray counts, and problem power, as a
+        # sweep stores them per cell (see results.ResultStore)
+        return np.array([
+            self.N_incident,
+            self.last_hit_counts[surface_id - NO_SURFACE],
+            self.N_rays,
+            self.last_hit_power[surface_id - NO_SURFACE],
+        ], dtype=float)
+
+    def converged(self, surface_id, target_ci):
+        # whether enough rays were traced to know the incident and problem
+        # fractions to within +/- target_ci, as the adaptive sweep decides
+        N_incident, N_problem, N_rays, _ = self.cell_counts(surface_id)
+        return not needs_rays(N_incident, N_problem, N_rays, target_ci)
+
+    def summary(self, mesh_id_to_name, z=1.96):
+        # printable table of ray fates, with intervals, and of the power each
+        # surface absorbs along the way
+        ray_fraction, power_fraction = self.last_hit_fractions()
+        absorbed_fraction = self.absorbed_fractions()
+        lo, hi = self.last_hit_intervals(z)
+        p, incident_lo, incident_hi = self.incident_fraction(z)
+        lines = [
+            f'{self.N_rays} rays, {p:.4f} [{incident_lo:.4f}, {incident_hi:.4f}] incident',
+            f'{"last surface":<16} {"rays":>8} {"fraction":>8} {"interval":>19} {"power":>8} {"absorbed":>8}',
+        ]
+        for i, surf_id in enumerate(self.surface_ids()):
+            lines.append(
+                f'{mesh_id_to_name[surf_id]:<16} {self.last_hit_counts[i]:>8d} {ray_fraction[i]:>8.4f} '
+                f'[{lo[i]:.4f}, {hi[i]:.4f}] {power_fraction[i]:>8.4f} {absorbed_fraction[i]:>8.4f}'
+            )
+        return '\n'.join(lines)
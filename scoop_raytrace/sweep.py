@@ -0,0 +1,528 @@
+import itertools
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+import geometry
+import ray_sets
+import tracer
+from results import ResultStore
+from stats import RunningStats, needs_rays, wilson_interval
+
+# per-process state, filled in once by init_worker
+_worker = {}
+
+
+# -----------------------------------------------------------------------------
+# Single grid cell
+# -----------------------------------------------------------------------------
+def cell_rays(az, el, N_rays, r_disc=3., r_sphere=10., rng=None, launch_hull=None,
+              disc_equivalent=False):
+    # sample points on a 10 m sphere: note that trial density is greater
+    # near poles, but this is just efficiency/angular sampling accuracy.
+    # Given the vertices of the scene's convex hull, only the part of the
+    # disc that can hit the scene is sampled, and the returned ray count is
+    # the number of rays the whole disc would need for the same sampling,
+    # so counts out of it are still fractions of the disc. If
+    # disc_equivalent, N_rays is also counted across the whole disc.
+    x = r_sphere * np.cos(az)
+    y = r_sphere * np.sin(el)
+    z = r_sphere * np.sin(az)
+    nhat = np.array([-x, -y, -z])
+    nhat /= np.linalg.norm(nhat)
+    if launch_hull is None:
+        return ray_sets.random_disc(r_disc, N_rays, [x, y, z], nhat, rng=rng)
+    rays, N_traced, area_weight = ray_sets.silhouette_disc(
+        r_disc, N_rays, [x, y, z], nhat, launch_hull, rng=rng,
+        disc_equivalent=disc_equivalent
+    )
+    if area_weight == 0:
+        # nothing in view: every ray of the disc would miss
+        return rays, N_rays
+    return rays, N_traced / area_weight
+
+
+def trace_cell(tscene, rays, N_bounces=3, max_consecutive_hits=10,
+               query_surface='cryostat_window', min_weight=0., rng=None,
+               analytic_mirrors=False):
+    # number of rays entering the system hull, number ending on the query
+    # surface and the power they carry there (in units of launched rays), for
+    # one cell's bundle of rays
+    paths = tracer.trace(
+        tscene,
+        rays,
+        N_bounces,
+        max_consecutive_hits,
+        check_incident=True,
+        min_weight=min_weight,
+        rng=rng,
+        analytic_mirrors=analytic_mirrors
+    )
+    stats = RunningStats(len(tscene.mesh_ids)).add(paths)
+    N_incident, N_problem, _, P_problem = stats.cell_counts(tscene.mesh_id(query_surface))
+    return N_incident, N_problem, P_problem, paths
+
+
+# -----------------------------------------------------------------------------
+# Symmetry
+# -----------------------------------------------------------------------------
+def mirror_partners(pts, mirrored_pts, tol=1e-9):
+    # for each of pts, the index of its mirror image in pts or its own,
+    # whichever is lower, so each pair is represented by its first member
+    own = np.arange(len(pts))
+    j = np.argmin(np.abs(pts[None, :] - mirrored_pts[:, None]), axis=1)
+    found = np.abs(pts[j] - mirrored_pts) < tol
+    return np.where(found, np.minimum(own, j), own)
+
+
+def mirror_sources(az_pts, el_pts, planes):
+    # flat index of the cell of the (el, az) grid traced in place of each
+    # cell, for a geometry mirror symmetric about planes (see
+    # geometry.mirror_planes): the cells of the fundamental domain map to
+    # themselves. A launch point (cos az, sin el, sin az) mirrors across
+    # x = 0 to az -> pi - az, and across y = 0 to el -> -el; cells whose
+    # mirror image is not on the grid are traced themselves.
+    az_pts = np.asarray(az_pts, dtype=float)
+    el_pts = np.asarray(el_pts, dtype=float)
+    source = np.arange(len(el_pts) * len(az_pts)).reshape(len(el_pts), len(az_pts))
+    for plane in planes:
+        if plane == 'x':
+            source = source[:, mirror_partners(az_pts, np.pi - az_pts)]
+        elif plane == 'y':
+            source = source[mirror_partners(el_pts, -el_pts), :]
+        else:
+            raise ValueError(f'Unknown mirror plane {plane}')
+    return source.ravel()
+
+
+def sweep_symmetry(designs, symmetry):
+    # mirror planes shared by every design: symmetry is 'auto' to detect
+    # them from the geometry, or a list of planes to declare them
+    if symmetry != 'auto':
+        return list(symmetry or [])
+    planes = None
+    for config in designs:
+        design_planes = geometry.mirror_planes(geometry.cached_geometry(config)[0])
+        planes = design_planes if planes is None else [p for p in planes if p in design_planes]
+    print(f'Geometry is mirror symmetric about {planes or "no plane"}')
+    return planes
+
+
+# -----------------------------------------------------------------------------
+# Sweep over the (az, el) grid
+# -----------------------------------------------------------------------------
+def init_worker(az_pts, el_pts, designs, incident_buf, problem_buf, power_buf,
+                settings, out_dir=None, save_paths=False):
+    # build the scene for each design once per process from the geometry
+    # cache; results land in shared memory, and in the result store on disk
+    # if there is one. With several designs, the meshes they have in common
+    # (see geometry.SHARED_MESHES) are built into one layer all their scenes
+    # cast against, and each design only adds its own, e.g. its scoop.
+    shared = None
+    _worker['tscenes'] = []
+    for config in designs:
+        geom = geometry.cached_geometry(config)
+        if shared is None and len(designs) > 1:
+            shared = tracer.shared_layer(*geom[:3], geometry.SHARED_MESHES)
+        _worker['tscenes'].append(tracer.TraceScene(*geom, shared=shared))
+    # every design is launched at from the silhouette of all of them, so
+    # they still see the same rays
+    _worker['launch_hull'] = np.concatenate([t.launch_hull for t in _worker['tscenes']])
+    _worker['az_pts'] = az_pts
+    _worker['el_pts'] = el_pts
+    shape = (len(designs), len(el_pts), len(az_pts))
+    _worker['results_incident'] = np.frombuffer(incident_buf).reshape(shape)
+    _worker['results_problem'] = np.frombuffer(problem_buf).reshape(shape)
+    _worker['results_power'] = np.frombuffer(power_buf).reshape(shape)
+    _worker['settings'] = settings
+    _worker['store'] = ResultStore(out_dir) if out_dir is not None else None
+    _worker['save_paths'] = save_paths
+
+
+def run_cell(idx):
+    # trace grid cell idx (flat index into the (el, az) grid) against every
+    # design, with the same ray bundle; the paths of the final cell are sent
+    # back for inspection. Each cell draws from its own random streams, so
+    # its results do not depend on which process traces it, or when.
+    settings = dict(_worker['settings'])
+    N_rays = settings.pop('N_rays', 3)
+    r_disc = settings.pop('r_disc', 3.)
+    seed = settings.pop('seed')
+    launch_hull = _worker['launch_hull'] if settings.pop('silhouette', False) else None
+    ie, ia = np.unravel_index(idx, (len(_worker['el_pts']), len(_worker['az_pts'])))
+    rng = ray_sets.rng_stream(seed, ie, ia, ray_sets.RAYS_STREAM)
+    rays, N_rays = cell_rays(_worker['az_pts'][ia], _worker['el_pts'][ie], N_rays, r_disc=r_disc, rng=rng, launch_hull=launch_hull)
+    cell_paths = []
+    for k, tscene in enumerate(_worker['tscenes']):
+        # every design sees the same random draws too
+        rng = ray_sets.rng_stream(seed, ie, ia, ray_sets.TRACE_STREAM)
+        N_incident, N_problem, P_problem, paths = trace_cell(tscene, rays, rng=rng, **settings)
+        _worker['results_incident'][k, ie, ia] = N_incident
+        _worker['results_problem'][k, ie, ia] = N_problem
+        _worker['results_power'][k, ie, ia] = P_problem
+        cell_paths.append(paths)
+    if _worker['store'] is not None:
+        _worker['store'].write_cell(
+            ie,
+            ia,
+            np.stack([
+                _worker['results_incident'][:, ie, ia],
+                _worker['results_problem'][:, ie, ia],
+                np.full(len(cell_paths), N_rays),
+                _worker['results_power'][:, ie, ia]
+            ], axis=-1),
+            paths=cell_paths if _worker['save_paths'] else None
+        )
+    if idx != len(_worker['el_pts']) * len(_worker['az_pts']) - 1:
+        cell_paths = None
+    return idx, cell_paths
+
+
+def run_sweep(az_pts, el_pts, designs=None, n_workers=None, out_dir=None,
+              save_paths=False, seed=ray_sets.SEED, symmetry=None, **settings):
+    # trace every (az, el) cell, split across n_workers processes (all cores
+    # by default; 1 runs in this process). settings are N_rays and r_disc for
+    # the ray bundle of each cell, silhouette to only launch where the disc
+    # can see the scene (see cell_rays), plus the trace_cell options.
+    # Returns results_incident, results_problem indexed [el, az], and the
+    # paths of the final cell (None if it was mirrored). Given a list of designs (see
+    # geometry.design()), every design is traced with the same rays and the
+    # results gain a leading design axis, with one set of paths per design.
+    # A KeyboardInterrupt stops the sweep early and keeps the cells finished
+    # so far.
+    # With an out_dir, every cell is written to a ResultStore there as it
+    # finishes (with the power reaching the query surface, and its paths if
+    # save_paths), and rerunning the same sweep
+    # resumes it, skipping finished cells. Every cell draws its rays from
+    # its own stream of the master seed, so the results are the same run
+    # serially, in parallel or resumed.
+    # With symmetry, 'auto' or a list of mirror planes (see mirror_sources),
+    # only one cell of each set of mirror images is traced, and the others
+    # are filled in by reflection.
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    settings = dict(settings, seed=seed)
+    batch = designs is not None
+    if not batch:
+        designs = [None]
+    N_cells = len(el_pts) * len(az_pts)
+    incident_buf = mp.RawArray('d', len(designs) * N_cells)
+    problem_buf = mp.RawArray('d', len(designs) * N_cells)
+    power_buf = mp.RawArray('d', len(designs) * N_cells)
+    # resolved here so spawned workers build exactly this process's designs
+    initargs = (az_pts, el_pts, [geometry.design(c) for c in designs],
+                incident_buf, problem_buf, power_buf, settings, out_dir,
+                save_paths)
+
+    planes = sweep_symmetry(initargs[2], symmetry)
+    source = mirror_sources(az_pts, el_pts, planes)
+    mirrored = np.flatnonzero(source != np.arange(N_cells))
+    if mirrored.size:
+        print(f'Tracing {N_cells - mirrored.size} of {N_cells} cells, mirroring the rest')
+
+    todo = np.flatnonzero(source == np.arange(N_cells)).tolist()
+    store = None
+    if out_dir is not None:
+        store_settings = dict(settings, mirror_planes=planes) if planes else settings
+        store = ResultStore(out_dir, az_pts, el_pts, designs if batch else None, store_settings)
+        finished = store.finished_cells()
+        if finished:
+            print(f'Resuming sweep: {len(finished)} of {N_cells} cells finished')
+        # pick up the finished cells' counts
+        shape = (len(designs), len(el_pts), len(az_pts))
+        results_incident, results_problem, _, results_power = store.results()
+        np.frombuffer(incident_buf).reshape(shape)[:] = np.nan_to_num(results_incident)
+        np.frombuffer(problem_buf).reshape(shape)[:] = np.nan_to_num(results_problem)
+        np.frombuffer(power_buf).reshape(shape)[:] = np.nan_to_num(results_power)
+        todo = sorted(set(todo) - set(finished))
+
+    paths = None
+    pool = None
+    try:
+        if n_workers == 1:
+            init_worker(*initargs)
+            cells = map(run_cell, todo)
+        else:
+            # build the geometry caches once up front, so workers only load
+            # them; one at a time, as full-resolution designs are large
+            for config in initargs[2]:
+                geometry.cached_geometry(config)
+            # spawn, not fork: open3d's thread pools do not survive a fork
+            pool = mp.get_context('spawn').Pool(
+                n_workers,
+                initializer=init_worker,
+                initargs=initargs
+            )
+            chunksize = max(1, len(todo) // (8 * n_workers))
+            cells = pool.imap_unordered(run_cell, todo, chunksize=chunksize)
+        t0 = time.perf_counter()
+        for i_done, (idx, cell_paths) in enumerate(cells):
+            if cell_paths is not None:
+                paths = cell_paths
+            rate = (i_done + 1) / (time.perf_counter() - t0)
+            print(
+                f'progress: {(i_done + 1) / len(todo):.2f}, {rate:.1f} cells/s, ' +
+                f'{(len(todo) - i_done - 1) / rate:.0f} s to go',
+                end='\r'
+            )
+        print()
+    except KeyboardInterrupt as e:
+        print(e)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    # fill in mirror images from the traced cells
+    results = [np.frombuffer(buf).reshape(len(designs), N_cells) for buf in [incident_buf, problem_buf, power_buf]]
+    for r in results:
+        r[:, mirrored] = r[:, source[mirrored]]
+    if store is not None:
+        finished = set(store.finished_cells())
+        for idx in mirrored:
+            if source[idx] in finished and idx not in finished:
+                counts = store.read_cell(*np.unravel_index(source[idx], store.shape))
+                store.write_cell(*np.unravel_index(idx, store.shape), counts)
+
+    shape = (len(designs), len(el_pts), len(az_pts))
+    results_incident = np.frombuffer(incident_buf).reshape(shape).copy()
+    results_problem = np.frombuffer(problem_buf).reshape(shape).copy()
+    if not batch:
+        results_incident = results_incident[0]
+        results_problem = results_problem[0]
+        paths = paths[0] if paths is not None else None
+    return results_incident, results_problem, paths
+
+
+# -----------------------------------------------------------------------------
+# Design sensitivity
+# -----------------------------------------------------------------------------
+def design_grid(parameters, base=None):
+    # a design for every combination of parameter values, on top of the base
+    # design (see geometry.design()), e.g.
+    # parameters = dict(dh=[-1.5, -1.25, 0], corrugation_angle=[0.4, 0.5])
+    base = geometry.design(base)
+    return [
+        dict(base, **dict(zip(parameters, values)))
+        for values in itertools.product(*parameters.values())
+    ]
+
+
+def sensitivity_table(designs, parameters, results_incident, results_problem, z=1.96):
+    # printable table of the problem fraction of each design, pooled over
+    # every cell of the sweep, with its interval, and of its worst cell
+    names = list(parameters)
+    N_incident = np.nansum(results_incident, axis=(1, 2))
+    N_problem = np.nansum(results_problem, axis=(1, 2))
+    lo, hi = wilson_interval(N_problem, N_incident, z)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        worst = np.nanmax(np.where(results_incident > 0, results_problem / results_incident, 0.), axis=(1, 2))
+    lines = [
+        ' '.join(f'{name:>18}' for name in names) +
+        f' {"incident":>10} {"problem":>8} {"fraction":>8} {"interval":>19} {"worst cell":>10}'
+    ]
+    for k, d in enumerate(designs):
+        lines.append(
+            ' '.join(f'{d[name]:>18.4f}' for name in names) +
+            f' {N_incident[k]:>10.0f} {N_problem[k]:>8.0f} {N_problem[k] / max(N_incident[k], 1):>8.4f}' +
+            f' [{lo[k]:.4f}, {hi[k]:.4f}] {worst[k]:>10.4f}'
+        )
+    return '\n'.join(lines)
+
+
+def run_sensitivity(az_pts, el_pts, parameters, base=None, out_dir=None, **settings):
+    # sweep every design of design_grid(parameters, base) in one job, each
+    # traced with the same rays in every cell, with the mirrors shared
+    # between them (see init_worker); settings are as for run_sweep. Prints
+    # the table of problem fractions against the parameters, also written to
+    # sensitivity.txt in out_dir, and returns the designs and
+    # results_incident, results_problem indexed [design, el, az].
+    designs = design_grid(parameters, base)
+    print(f'Sweeping {len(designs)} designs over {", ".join(parameters)}')
+    results_incident, results_problem, _ = run_sweep(
+        az_pts, el_pts, designs=designs, out_dir=out_dir, **settings
+    )
+    table = sensitivity_table(designs, parameters, results_incident, results_problem)
+    print(table)
+    if out_dir is not None:
+        with open(os.path.join(out_dir, 'sensitivity.txt'), 'w') as f:
+            f.write(table + '\n')
+    return designs, results_incident, results_problem
+
+
+# -----------------------------------------------------------------------------
+# Adaptive sweep
+# -----------------------------------------------------------------------------
+def init_adaptive_worker(az_pts, el_pts, config, settings):
+    _worker['tscene'] = tracer.TraceScene(*geometry.cached_geometry(config))
+    _worker['az_pts'] = az_pts
+    _worker['el_pts'] = el_pts
+    _worker['settings'] = settings
+
+
+def run_batch(task):
+    # trace one more batch of rays for a cell; each batch of a cell gets its
+    # own random stream, keyed by how many rays the cell has seen already
+    ie, ia, N_rays, N_launched = task
+    settings = dict(_worker['settings'])
+    r_disc = settings.pop('r_disc', 3.)
+    seed = settings.pop('seed')
+    launch_hull = _worker['tscene'].launch_hull if settings.pop('silhouette', False) else None
+    key = (ie, ia, N_launched)
+    rng = ray_sets.rng_stream(seed, *key, ray_sets.RAYS_STREAM)
+    # the adaptive budgets count rays across the whole disc
+    rays, N_rays = cell_rays(
+        _worker['az_pts'][ia], _worker['el_pts'][ie], N_rays, r_disc=r_disc,
+        rng=rng, launch_hull=launch_hull, disc_equivalent=True
+    )
+    rng = ray_sets.rng_stream(seed, *key, ray_sets.TRACE_STREAM)
+    N_incident, N_problem, P_problem, _ = trace_cell(_worker['tscene'], rays, rng=rng, **settings)
+    return ie, ia, N_rays, N_incident, N_problem, P_problem
+
+
+def new_midpoints(sampled, incident, problem, launched, target_ci):
+    # cells halfway between neighbouring sampled cells of a row or column
+    # whose incident or problem fractions differ by more than 2 * target_ci
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_incident = incident / launched
+        p_problem = np.where(incident > 0, problem / incident, 0.)
+    new = np.zeros_like(sampled)
+    for axis in [0, 1]:
+        lines = sampled if axis == 1 else sampled.T
+        for i_line, line in enumerate(lines):
+            idx = np.flatnonzero(line)
+            for a, b in zip(idx[:-1], idx[1:]):
+                if b - a < 2:
+                    continue
+                cell_a = (i_line, a) if axis == 1 else (a, i_line)
+                cell_b = (i_line, b) if axis == 1 else (b, i_line)
+                change = max(
+                    abs(p_incident[cell_a] - p_incident[cell_b]),
+                    abs(p_problem[cell_a] - p_problem[cell_b])
+                )
+                if change > 2 * target_ci:
+                    mid = (a + b) // 2
+                    new[(i_line, mid) if axis == 1 else (mid, i_line)] = True
+    return new & ~sampled
+
+
+def run_adaptive_sweep(az_range, el_range, coarse_step, min_step, config=None,
+                       n_workers=None, out_dir=None, N_rays_initial=100,
+                       N_rays_max=10000, target_ci=0.05, max_rounds=20,
+                       seed=ray_sets.SEED, symmetry=None, **settings):
+    # sweep with a coarse (az, el) grid first, then refine in rounds: cells
+    # whose fractions are not yet known to +/- target_ci get twice as many
+    # rays (up to N_rays_max), and where the maps change fast between
+    # neighbouring cells the cell halfway between them is added, down to
+    # min_step. Stops when no cell needs work, or after max_rounds. Steps
+    # and ranges are in radians; coarse_step should be min_step times a
+    # power of two. With silhouette launching, ray counts and budgets are
+    # counted across the whole launch disc, see cell_rays.
+    # Returns the fine az/el grid and results_incident, results_problem and
+    # the rays launched per cell, NaN where a cell was never sampled. With an
+    # out_dir, the counts are kept in a ResultStore, and rerunning resumes
+    # from the stored cells. With symmetry, as for run_sweep, only the
+    # fundamental domain is refined and traced, and mirrored at the end.
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    az_pts = np.arange(az_range[0], az_range[1] + min_step / 2, min_step)
+    el_pts = np.arange(el_range[0], el_range[1] + min_step / 2, min_step)
+    shape = (len(el_pts), len(az_pts))
+    stride = int(round(coarse_step / min_step))
+    settings = dict(settings, seed=seed)
+    planes = sweep_symmetry([geometry.design(config)], symmetry)
+    source = mirror_sources(az_pts, el_pts, planes).reshape(shape)
+    domain = source == np.arange(source.size).reshape(shape)
+
+    incident = np.zeros(shape)
+    problem = np.zeros(shape)
+    launched = np.zeros(shape)
+    power = np.zeros(shape)
+    store = None
+    if out_dir is not None:
+        meta = dict(
+            settings,
+            adaptive=True,
+            coarse_step=coarse_step,
+            N_rays_initial=N_rays_initial,
+            N_rays_max=N_rays_max,
+            target_ci=target_ci,
+        )
+        if planes:
+            meta['mirror_planes'] = planes
+        store = ResultStore(out_dir, az_pts, el_pts, None, meta)
+        stored = np.nan_to_num(np.stack(store.results())[:, 0])
+        incident, problem, launched, power = stored
+    sampled = (launched > 0) & domain
+
+    # coarse pass, always including the edges of the range
+    coarse = np.zeros(shape, dtype=bool)
+    coarse[np.ix_(
+        np.unique(np.r_[np.arange(0, shape[0], stride), shape[0] - 1]),
+        np.unique(np.r_[np.arange(0, shape[1], stride), shape[1] - 1])
+    )] = True
+    todo = [(ie, ia, N_rays_initial, 0) for ie, ia in zip(*np.nonzero(coarse & domain & ~sampled))]
+
+    # resolved here so spawned workers build exactly this process's design
+    initargs = (az_pts, el_pts, geometry.design(config), settings)
+    pool = None
+    try:
+        if n_workers == 1:
+            init_adaptive_worker(*initargs)
+            batches = lambda tasks: map(run_batch, tasks)
+        else:
+            geometry.cached_geometry(initargs[2])
+            pool = mp.get_context('spawn').Pool(
+                n_workers,
+                initializer=init_adaptive_worker,
+                initargs=initargs
+            )
+            batches = lambda tasks: pool.imap_unordered(run_batch, tasks)
+        for i_round in range(max_rounds):
+            if not todo:
+                # refine rays where fractions are uncertain, cells where they
+                # change fast
+                more_rays = sampled & (launched < N_rays_max) & needs_rays(incident, problem, launched, target_ci)
+                new = new_midpoints(sampled, incident, problem, launched, target_ci) & domain
+                todo += [
+                    (ie, ia, max(1, int(min(launched[ie, ia], N_rays_max - launched[ie, ia]))), int(launched[ie, ia]))
+                    for ie, ia in zip(*np.nonzero(more_rays))
+                ]
+                todo += [(ie, ia, N_rays_initial, 0) for ie, ia in zip(*np.nonzero(new))]
+            if not todo:
+                break
+            print(
+                f'Round {i_round}: tracing {sum(t[2] for t in todo)} rays in ' +
+                f'{len(todo)} cells, {sampled.sum()} cells sampled so far'
+            )
+            for ie, ia, N_rays, N_incident, N_problem, P_problem in batches(todo):
+                incident[ie, ia] += N_incident
+                problem[ie, ia] += N_problem
+                launched[ie, ia] += N_rays
+                power[ie, ia] += P_problem
+                sampled[ie, ia] = True
+                if store is not None:
+                    store.write_cell(ie, ia, [[incident[ie, ia], problem[ie, ia], launched[ie, ia], power[ie, ia]]])
+            todo = []
+    except KeyboardInterrupt as e:
+        print(e)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    # fill in mirror images from the traced cells
+    mirrored = ~domain & sampled[np.unravel_index(source, shape)]
+    for r in [incident, problem, launched, power]:
+        r[mirrored] = r.ravel()[source[mirrored]]
+    if store is not None:
+        for ie, ia in zip(*np.nonzero(mirrored)):
+            store.write_cell(ie, ia, [[incident[ie, ia], problem[ie, ia], launched[ie, ia], power[ie, ia]]])
+    sampled |= mirrored
+
+    incident[~sampled] = np.nan
+    problem[~sampled] = np.nan
+    launched[~sampled] = np.nan
+    return az_pts, el_pts, incident, problem, launched
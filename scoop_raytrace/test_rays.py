@@ -9,7 +9,7 @@ import numpy as np
 
 import geometry
 
-meshes, _, _= geometry.get_geometry()
+meshes, _, _, _ = geometry.cached_geometry()
 mesh = meshes[3]
 
 # Create scene and add the monkey model.
@@ -0,0 +1,153 @@
+import contextlib
+import functools
+import json
+import os
+import time
+
+# pipeline stages, in the order a run goes through them:
+#   geometry  building the meshes, per component (see geometry.get_geometry)
+#   hull      the system hull, and a scene's launch hull and hull planes
+#   scene     raycasting scenes, their BVHs and per-triangle tables
+#   rays      generating ray bundles
+#   cast      one cast of the live rays, per bounce
+#   bounce    everything else the bounce engine does per bounce
+#   stats     reducing paths into RunningStats
+#   io        geometry caches, result stores, saved paths and renders
+STAGES = ['geometry', 'hull', 'scene', 'rays', 'cast', 'bounce', 'stats', 'io']
+
+# set by start_log, and inherited by worker processes spawned after it
+LOG_ENV = 'RAYTRACE_TIMING_LOG'
+RUN_ENV = 'RAYTRACE_TIMING_RUN'
+
+# calls, seconds and rays per stage in this process
+_totals = {}
+_log = {}
+
+
+def start_log(path):
+    # append a JSON line per stage record to path, from this process and
+    # the worker processes it starts from now on, tagged with a new run id
+    os.environ[LOG_ENV] = path
+    os.environ[RUN_ENV] = f'{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}'
+    if _log.get('file') is not None:
+        _log['file'].close()
+    _log.clear()
+    _log['start'] = time.time()
+    _totals.clear()
+
+
+def log_file():
+    # the open log, or None if not logging
+    if 'file' not in _log:
+        path = os.environ.get(LOG_ENV)
+        _log['run'] = os.environ.get(RUN_ENV)
+        # line buffered: each record is one small append, so records of
+        # concurrent processes do not interleave
+        _log['file'] = open(path, 'a', buffering=1) if path else None
+    return _log['file']
+
+
+def record(stage, seconds, n_rays=None, **fields):
+    # one stage record: added to this process's totals, and written to the
+    # log if there is one. fields are extra context, e.g. bounce=2
+    n_rays = None if n_rays is None else int(n_rays)
+    totals = _totals.setdefault(stage, [0, 0., 0])
+    totals[0] += 1
+    totals[1] += seconds
+    totals[2] += n_rays or 0
+    f = log_file()
+    if f is not None:
+        line = dict(
+            stage=stage,
+            seconds=seconds,
+            n_rays=n_rays,
+            rays_per_s=n_rays / seconds if n_rays and seconds > 0 else None,
+            run=_log['run'],
+            pid=os.getpid(),
+            time=time.time(),
+            **fields
+        )
+        f.write(json.dumps(line) + '\n')
+
+
+@contextlib.contextmanager
+def stage(name, n_rays=None, **fields):
+    # time the block as one record of stage name; the yielded dict can add
+    # fields found inside the block, e.g. info['n_rays'] = len(rays)
+    info = dict(fields, n_rays=n_rays)
+    t0 = time.perf_counter()
+    yield info
+    seconds = time.perf_counter() - t0
+    record(name, seconds, **info)
+
+
+def totals():
+    # calls, seconds and rays per stage recorded in this process so far
+    return {k: list(v) for k, v in _totals.items()}
+
+
+def timed(name, n_rays=None):
+    # decorator timing every call of a function as a record of stage name;
+    # n_rays(result) is the number of rays of each call, if given
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - t0
+            record(name, seconds, n_rays=n_rays(result) if n_rays else None)
+            return result
+        return wrapper
+    return decorator
+
+
+def read_log(path, run=None):
+    # the records of a log, only those of one run if given
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run is not None:
+        records = [r for r in records if r.get('run') == run]
+    return records
+
+
+def summarize(records):
+    # calls, seconds and rays per stage of a list of records
+    totals = {}
+    for r in records:
+        t = totals.setdefault(r['stage'], [0, 0., 0])
+        t[0] += 1
+        t[1] += r['seconds']
+        t[2] += r['n_rays'] or 0
+    return totals
+
+
+def summary(totals=None):
+    # printable table of time per stage: by default of this run's log, which
+    # includes its worker processes, or of this process without a log
+    header = []
+    if totals is None:
+        path = os.environ.get(LOG_ENV)
+        if path and os.path.exists(path):
+            if _log.get('file') is not None:
+                _log['file'].flush()
+            records = read_log(path, os.environ.get(RUN_ENV))
+            totals = summarize(records)
+            n_processes = len({r['pid'] for r in records})
+            header.append(f'{path}: {len(records)} records from {n_processes} processes')
+        else:
+            totals = _totals
+    if 'start' in _log:
+        header.append(f'{time.time() - _log["start"]:.2f} s wall time since the log started')
+    total_seconds = sum(t[1] for t in totals.values())
+    lines = header + [
+        f'{"stage":<10} {"calls":>8} {"seconds":>10} {"share":>6} {"rays":>12} {"rays/s":>12}'
+    ]
+    for name in STAGES + sorted(set(totals) - set(STAGES)):
+        if name not in totals:
+            continue
+        calls, seconds, n_rays = totals[name]
+        rate = f'{n_rays / seconds:>12.0f}' if n_rays and seconds > 0 else f'{"":>12}'
+        lines.append(
+            f'{name:<10} {calls:>8d} {seconds:>10.3f} {seconds / max(total_seconds, 1e-12):>6.1%} {n_rays:>12d} {rate}'
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,537 @@
+import time
+
+import numpy as np
+
+import open3d as o3d
+from scipy.spatial import ConvexHull
+
+import timing
+from ray_sets import NO_SURFACE, SEED, TRACE_STREAM, PathStore, rng_stream
+from stats import RunningStats
+
+# above this many face planes, a BVH signed-distance query beats testing every
+# plane; the full-resolution system hull has ~70k (the primary's underside)
+MAX_HULL_PLANES = 256
+
+# analytic mirror hits further than this from the faceted hit are not
+# trusted, e.g. where the conic continues past the edge of the mirror; well
+# above the sagitta of even coarse meshes
+MAX_REFINE_DISTANCE = 0.05
+
+# points count as inside the system hull only this far in: hits on the
+# outside of the scoop lie on the hull itself, and would otherwise be in or
+# out by float rounding
+HULL_MARGIN = 1e-4
+
+# label position vector u, direction vector v, surface normal n
+u_ = np.s_[0:3] # ray array position
+v_ = np.s_[3:] # ray array direction
+
+
+# -----------------------------------------------------------------------------
+# Scene
+# -----------------------------------------------------------------------------
+# what the bounce engine needs to know about each triangle: its centroid and
+# outward normal, optics (see geometry.SURFACE_OPTICS; meshes without them are
+# perfect mirrors), whether rays end on it, which of a merged group of parts
+# (e.g. louver vanes) it belongs to, 0 for single-part meshes, and the
+# (z0, R, 1 + conic constant) of the mirror surface it approximates, NaN if
+# none, see geometry.set_quadrics
+TRIANGLE_DTYPE = np.dtype([
+    ('centroid', np.float32, 3),
+    ('normal', np.float32, 3),
+    ('reflectance', np.float32),
+    ('absorptance', np.float32),
+    ('diffuse', np.float32),
+    ('is_absorber', bool),
+    ('part', np.int32),
+    ('quadric', np.float64, 3),
+])
+
+
+class MeshLayer(object):
+    # a raycasting scene of some meshes and one table of all their triangles,
+    # converted to numpy once instead of once per hit. A layer of the meshes
+    # every design of a sweep has in common, e.g. the mirrors, can be shared
+    # by the TraceScenes of all of them, so it is only built once.
+    def __init__(self, meshes, mesh_names, is_absorber):
+        t0 = time.perf_counter()
+        self.meshes = meshes
+        self.mesh_names = mesh_names
+        self.is_absorber = np.array(is_absorber, dtype=bool)
+        self.scene = o3d.t.geometry.RaycastingScene()
+        for m in meshes:
+            self.scene.add_triangles(m)
+        # the BVH is built on the first cast: build it now, with the scene
+        self.scene.cast_rays(o3d.core.Tensor(np.zeros((0, 6), dtype=np.float32)))
+
+        # triangle primitive_id of the layer's mesh i is row
+        # triangle_offsets[i] + primitive_id
+        optics = dict(reflectance=1., absorptance=0., diffuse=0.)
+        tables = []
+        for mesh, is_absorber in zip(meshes, self.is_absorber):
+            v = mesh.vertex['positions'].numpy()
+            t = mesh.triangle['indices'].numpy()
+            table = np.zeros(len(t), dtype=TRIANGLE_DTYPE)
+            table['centroid'] = v[t].mean(axis=1)
+            table['normal'] = mesh.triangle.normals.numpy()
+            for k, default in optics.items():
+                table[k] = mesh.triangle[k].numpy() if k in mesh.triangle else default
+            if 'part' in mesh.triangle:
+                table['part'] = mesh.triangle['part'].numpy()
+            table['quadric'] = mesh.triangle['quadric'].numpy() if 'quadric' in mesh.triangle else np.nan
+            # rays end on absorbers, which take all the power reaching them,
+            # and on surfaces that reflect nothing
+            table['is_absorber'] = is_absorber | (table['reflectance'] == 0)
+            table['reflectance'][table['is_absorber']] = 0.
+            if is_absorber:
+                table['absorptance'] = 1.
+            tables.append(table)
+        n_triangles = np.array([len(t) for t in tables], dtype=np.int64)
+        self.triangle_offsets = np.r_[0, np.cumsum(n_triangles)[:-1]].astype(np.int64)
+        self.triangles = np.concatenate(tables) if tables else np.zeros(0, dtype=TRIANGLE_DTYPE)
+        timing.record('scene', time.perf_counter() - t0, n_triangles=len(self.triangles))
+
+        # vertices of the convex hull of the layer's meshes, from which the
+        # hull of a scene of several layers follows cheaply
+        with timing.stage('hull'):
+            pos = np.concatenate([m.vertex['positions'].numpy() for m in meshes]) if meshes else np.zeros((0, 3))
+            self.hull_points = pos[ConvexHull(pos).vertices] if len(pos) > 3 else pos
+
+    def match(self, meshes, mesh_names, is_absorber):
+        # index in meshes of each of the layer's meshes, found by name and
+        # matching vertices, triangles and absorber status, or None unless
+        # all of them are there
+        ids = []
+        for layer_mesh, name, layer_absorber in zip(self.meshes, self.mesh_names, self.is_absorber):
+            found = [
+                i for i, m in enumerate(meshes)
+                if mesh_names[i] == name and is_absorber[i] == layer_absorber and (
+                    m is layer_mesh or (
+                        np.array_equal(m.vertex['positions'].numpy(), layer_mesh.vertex['positions'].numpy())
+                        and np.array_equal(m.triangle['indices'].numpy(), layer_mesh.triangle['indices'].numpy())
+                    )
+                ) and i not in ids
+            ]
+            if not found:
+                return None
+            ids.append(found[0])
+        return np.array(ids, dtype=np.int32)
+
+
+def shared_layer(meshes, mesh_names, absorber_meshes, shared_names):
+    # a MeshLayer of the meshes of a design named in shared_names (e.g.
+    # geometry.SHARED_MESHES), for the TraceScenes of designs that share them
+    keep = [i for i, name in enumerate(mesh_names[1:]) if name in shared_names]
+    return MeshLayer(
+        [meshes[i] for i in keep],
+        [mesh_names[1:][i] for i in keep],
+        [any(meshes[i] is a for a in absorber_meshes) for i in keep]
+    )
+
+
+class TraceScene(object):
+    # the meshes of one design, in one or more MeshLayers, plus what the
+    # bounce engine needs to cast against them as one scene. Geometry id i is
+    # meshes[i]. Given a shared MeshLayer holding some of the meshes, those
+    # are cast against there, and only the rest (e.g. the scoop and louvers
+    # of one design of a sweep) are built into a layer of this scene's own;
+    # if any of the shared meshes is missing from this design, it is built
+    # in full instead.
+    def __init__(self, meshes, mesh_names, absorber_meshes, system_hull=None, shared=None):
+        is_absorber = [any(m is a for a in absorber_meshes) for m in meshes]
+        shared_ids = shared.match(meshes, mesh_names[1:], is_absorber) if shared is not None else None
+        self.layers = []
+        meshes = list(meshes)
+        if shared_ids is not None:
+            self.layers.append((shared, shared_ids))
+            # drop this design's copies of the shared meshes
+            for k, i in enumerate(shared_ids):
+                meshes[i] = shared.meshes[k]
+        own_ids = np.array([i for i in range(len(meshes)) if shared_ids is None or i not in shared_ids], dtype=np.int32)
+        if own_ids.size:
+            self.layers.append((
+                MeshLayer([meshes[i] for i in own_ids], [mesh_names[1:][i] for i in own_ids], [is_absorber[i] for i in own_ids]),
+                own_ids
+            ))
+
+        self.meshes = meshes
+        self.mesh_ids = list(range(len(meshes)))
+        self.geom_dict = dict(enumerate(meshes))
+        self.mesh_id_to_name = {
+            mesh_id: mesh_names[i]
+            for i, mesh_id in enumerate([NO_SURFACE] + self.mesh_ids)
+        }
+        self.is_absorber = np.array(is_absorber, dtype=bool)
+
+        # the layers' triangle tables are read as if concatenated in layer
+        # order: triangle primitive_id of mesh geometry_id is row
+        # triangle_offsets[geometry_id] + primitive_id
+        n_rows = [len(layer.triangles) for layer, _ in self.layers]
+        self.layer_offsets = np.r_[0, np.cumsum(n_rows)[:-1]].astype(np.int64)
+        self.triangle_offsets = np.zeros(len(meshes), dtype=np.int64)
+        for (layer, ids), offset in zip(self.layers, self.layer_offsets):
+            self.triangle_offsets[ids] = offset + layer.triangle_offsets
+
+        # vertices of the convex hull of everything in the scene: no ray can
+        # hit anything without passing through it, see
+        # ray_sets.silhouette_disc
+        t0 = time.perf_counter()
+        if len(self.layers) == 1:
+            self.launch_hull = self.layers[0][0].hull_points
+        else:
+            scene_pos = np.concatenate([layer.hull_points for layer, _ in self.layers])
+            self.launch_hull = scene_pos[ConvexHull(scene_pos).vertices]
+        # and a sphere around it: a ray starting outside the sphere and not
+        # heading into it cannot hit anything either
+        self.sphere_center = (self.launch_hull.min(axis=0) + self.launch_hull.max(axis=0)) / 2.
+        self.sphere_radius = np.linalg.norm(self.launch_hull - self.sphere_center, axis=1).max() + 1e-3
+
+        self.hull_scene = None
+        self.hull_planes = None
+        if system_hull is not None:
+            hull_pos = system_hull.vertex['positions'].numpy()
+            self.hull_bounds = hull_pos.min(axis=0), hull_pos.max(axis=0)
+            normals, offsets = hull_planes(system_hull)
+            if len(offsets) <= MAX_HULL_PLANES:
+                self.hull_planes = normals.astype(np.float32), offsets.astype(np.float32)
+            else:
+                self.hull_scene = o3d.t.geometry.RaycastingScene()
+                self.hull_scene.add_triangles(system_hull)
+        timing.record('hull', time.perf_counter() - t0)
+
+    def cast(self, rays):
+        # distance to the nearest hit of each ray over every layer (inf if it
+        # hits nothing), and the geometry and primitive ids of what it hits
+        rays = as_tensor(rays)
+        t_hit = None
+        for layer, ids in self.layers:
+            ans = layer.scene.cast_rays(rays)
+            t = ans['t_hit'].numpy()
+            hit = np.isfinite(t)
+            geometry_ids = np.zeros(len(t), dtype=np.int32)
+            geometry_ids[hit] = ids[ans['geometry_ids'].numpy()[hit]]
+            primitive_ids = ans['primitive_ids'].numpy()
+            if t_hit is None:
+                t_hit, nearest_ids, nearest_primitives = t, geometry_ids, primitive_ids
+                continue
+            closer = t < t_hit
+            t_hit = np.where(closer, t, t_hit)
+            nearest_ids = np.where(closer, geometry_ids, nearest_ids)
+            nearest_primitives = np.where(closer, primitive_ids, nearest_primitives)
+        return t_hit, nearest_ids, nearest_primitives
+
+    def triangle_index(self, geometry_ids, primitive_ids):
+        # rows of the per-triangle tables for each hit
+        return self.triangle_offsets[geometry_ids] + primitive_ids
+
+    def triangles(self, tri):
+        # one gather of everything about the triangles at rows tri, as
+        # TRIANGLE_DTYPE records
+        if len(self.layers) == 1:
+            return self.layers[0][0].triangles[tri]
+        rows = np.empty(len(tri), dtype=TRIANGLE_DTYPE)
+        for (layer, _), offset in zip(self.layers, self.layer_offsets):
+            in_layer = (tri >= offset) & (tri < offset + len(layer.triangles))
+            rows[in_layer] = layer.triangles[tri[in_layer] - offset]
+        return rows
+
+    def inside_hull(self, pos):
+        # one batched query for all points: those outside the hull's bounding
+        # box are out; the rest are tested against the face planes of the
+        # (convex by construction) hull, or with a signed-distance query if
+        # it has too many planes
+        pos = np.asarray(pos, dtype=np.float32)
+        inside = np.all((pos > self.hull_bounds[0]) & (pos < self.hull_bounds[1]), axis=1)
+        query = np.flatnonzero(inside)
+        if not query.size:
+            return inside
+        if self.hull_planes is not None:
+            normals, offsets = self.hull_planes
+            inside[query] = np.all(pos[query] @ normals.T < offsets - HULL_MARGIN, axis=1)
+        else:
+            inside[query] = self.hull_scene.compute_signed_distance(as_tensor(pos[query])).numpy() < -HULL_MARGIN
+        return inside
+
+    def misses_sphere(self, rays):
+        # rays, of unit direction, that start outside the bounding sphere and
+        # either point away from it or pass it by
+        p = rays[:, u_] - self.sphere_center
+        b = np.sum(p * rays[:, v_], axis=-1)
+        c = np.sum(p * p, axis=-1) - self.sphere_radius**2
+        return (c > 0) & ((b >= 0) | (b * b < c))
+
+    def mesh_id(self, mesh_name):
+        return next(k for k, v in self.mesh_id_to_name.items() if v == mesh_name)
+
+    def mesh_color(self, mesh_id):
+        if mesh_id == NO_SURFACE:
+            return np.array([0.5, 0.5, 0.5])
+        return self.geom_dict[mesh_id].vertex.colors[0].numpy()
+
+
+def as_tensor(a):
+    # float32 array as an Open3D tensor sharing its buffer, where
+    # o3d.core.Tensor(a) would copy it; results read back with .numpy() are
+    # views too, so ray state crosses into the raycasting scene and back
+    # without a copy or a dtype conversion
+    return o3d.core.Tensor.from_numpy(np.ascontiguousarray(a, dtype=np.float32))
+
+
+def hull_planes(hull):
+    # outward unit normals n and offsets d of the face planes n.x = d of a
+    # convex mesh, one per distinct plane
+    v = hull.vertex['positions'].numpy().astype(np.float64)
+    t = hull.triangle['indices'].numpy()
+    normals = np.cross(v[t[:, 1]] - v[t[:, 0]], v[t[:, 2]] - v[t[:, 0]])
+    area = np.linalg.norm(normals, axis=1)
+    keep = area > 0 # skip degenerate triangles
+    normals = normals[keep] / area[keep, None]
+    offsets = np.sum(normals * v[t[keep, 0]], axis=1)
+    # orient outward, away from the vertex centroid, which is inside
+    flip = normals @ v.mean(axis=0) - offsets > 0
+    normals[flip] *= -1
+    offsets[flip] *= -1
+    # coplanar triangles share a plane
+    planes = np.unique(np.round(np.hstack([normals, offsets[:, None]]), 6), axis=0)
+    return planes[:, :3], planes[:, 3]
+
+
+# -----------------------------------------------------------------------------
+# Bounce engine
+# -----------------------------------------------------------------------------
+def reflect(vhat, nhat):
+    # https://3dkingdoms.com/weekly/weekly.php?a=2
+    vhat_new = -2. * np.sum(vhat * nhat, axis=-1, keepdims=True) * nhat + vhat
+    return vhat_new / np.linalg.norm(vhat_new, axis=-1, keepdims=True)
+
+
+def intersect_quadric(start, t_hit, quadric):
+    # exact intersection of rays start with the conics of revolution
+    # quadric = (z0, R, a), x^2 + y^2 - 2 R w + a w^2 = 0 with w = z - z0,
+    # taking the root nearest the faceted hit distance t_hit. Returns the
+    # distance, NaN where the ray misses the conic, and the unit normal there.
+    o = start[:, u_].astype(np.float64)
+    d = start[:, v_].astype(np.float64)
+    z0, R, a = quadric.T
+    w = o[:, 2] - z0
+    A = d[:, 0]**2 + d[:, 1]**2 + a * d[:, 2]**2
+    B = 2. * (o[:, 0] * d[:, 0] + o[:, 1] * d[:, 1] - R * d[:, 2] + a * w * d[:, 2])
+    C = o[:, 0]**2 + o[:, 1]**2 - 2. * R * w + a * w**2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sqrt_disc = np.sqrt(B**2 - 4. * A * C)
+        # stable roots; C / q is the second root, and -C / B if A == 0
+        q = -0.5 * (B + np.copysign(sqrt_disc, B))
+        roots = np.stack([q / A, C / q], axis=-1)
+        roots[A == 0] = (-C / B)[A == 0, None]
+    t_exact = roots[np.arange(len(roots)), np.argmin(np.abs(np.nan_to_num(roots, nan=np.inf) - t_hit[:, None]), axis=-1)]
+    p = o + d * t_exact[:, None]
+    n = np.stack([2. * p[:, 0], 2. * p[:, 1], 2. * (a * (p[:, 2] - z0) - R)], axis=-1)
+    n /= np.linalg.norm(n, axis=-1, keepdims=True)
+    return t_exact, n
+
+
+def lambertian(nhat, rng):
+    # cosine-weighted random directions in the hemispheres about nhat
+    u1, u2 = rng.uniform(size=(2, len(nhat)))
+    r = np.sqrt(u1)[:, None]
+    phi = 2. * np.pi * u2[:, None]
+    # any unit vector not parallel to nhat gives the tangent plane's basis
+    a = np.where(np.abs(nhat[:, :1]) < 0.9, [[1., 0., 0.]], [[0., 1., 0.]])
+    t_hat = np.cross(nhat, a)
+    t_hat /= np.linalg.norm(t_hat, axis=-1, keepdims=True)
+    b_hat = np.cross(nhat, t_hat)
+    return r * np.cos(phi) * t_hat + r * np.sin(phi) * b_hat + np.sqrt(1. - u1)[:, None] * nhat
+
+
+def trace(tscene, rays, N_bounces, max_consecutive_hits, check_incident=False,
+          verbose=False, min_weight=0., rng=None, analytic_mirrors=False):
+    # trace the whole ray population at once, keeping every live ray as a row
+    # of an (N, 6) array, and record the history of each ray in a PathStore.
+    # Path incidence on the system hull is only tracked if check_incident.
+    # Each ray carries a weight, its power relative to launch, scaled by the
+    # reflectance of every surface it leaves. Once a weight falls below
+    # min_weight the ray plays Russian roulette: it survives with probability
+    # weight / min_weight, carrying min_weight, so power estimates stay
+    # unbiased while rays that no longer carry meaningful power stop being
+    # traced; N_bounces then only caps runaway paths. rng drives roulette
+    # and diffuse reflections.
+    # With analytic_mirrors, hits on the mirrors' conic faces are moved from
+    # the facets onto the exact surface, and reflect about its exact normal,
+    # so coarse mirror meshes still focus properly.
+    if rng is None:
+        rng = np.random.default_rng(seed=SEED)
+    if isinstance(rays, o3d.core.Tensor):
+        rays = rays.numpy()
+    rays = np.asarray(rays, dtype=np.float32)
+    paths = PathStore(rays, N_bounces)
+    # make double-sure units of distance are still 1m
+    paths.rays[:, 0, v_] /= np.linalg.norm(rays[:, v_], axis=-1, keepdims=True)
+    incident = paths.incident
+    terminated = paths.terminated
+    weight = np.ones(len(paths), dtype=np.float32) # carried to the next hit
+    # the surface (mesh and part) each path last reflected from, and how many
+    # times in a row it has; a long run indicates a ray may be trapped inside
+    # a mesh
+    last_mesh = np.full(len(paths), NO_SURFACE, dtype=np.int32)
+    last_part = np.zeros(len(paths), dtype=np.int32)
+    n_consecutive = np.zeros(len(paths), dtype=np.int32)
+
+    # each bounce is timed as one cast record and one record of everything
+    # else, see timing.STAGES
+    i_bounce = 0
+    while i_bounce < N_bounces:
+        t_bounce = time.perf_counter()
+        # build the set of rays to trace
+        live = np.flatnonzero(~terminated)
+        if not live.size:
+            break
+        # one contiguous float32 (N_live, 6) buffer, cast in place
+        start = paths.last_rays(live)
+        # rays leaving the scene's bounding sphere end without a cast
+        culled = tscene.misses_sphere(start)
+        if culled.any():
+            terminated[live[culled]] = True
+            live = live[~culled]
+            start = start[~culled]
+            if not live.size:
+                break
+
+        t_cast = time.perf_counter()
+        t_hit, geometry_ids, primitive_ids = tscene.cast(start)
+        cast_seconds = time.perf_counter() - t_cast
+        timing.record('cast', cast_seconds, n_rays=len(start), bounce=i_bounce)
+        distance_finite = np.isfinite(t_hit)
+        terminated[live[~distance_finite]] = True
+
+        idx = live[distance_finite]
+        start = start[distance_finite]
+        geometry_ids = geometry_ids[distance_finite]
+        primitive_ids = primitive_ids[distance_finite]
+        if verbose:
+            names, counts = np.unique(
+                [tscene.mesh_id_to_name[i] for i in geometry_ids],
+                return_counts=True
+            )
+            print(f'Bounce {i_bounce} finds {len(idx)} hits on surfaces {dict(zip(names.tolist(), counts.tolist()))}')
+        end = start.copy()
+        end[:, u_] += start[:, v_] * t_hit[distance_finite, None]
+
+        # check to see if path has entered hull of interest - whichever rays
+        # hit a forbidden surface afterward are problematic
+        if check_incident:
+            query = ~incident[idx]
+            incident[idx[query]] = tscene.inside_hull(end[query][:, u_])
+
+        # everything needed about the hit triangles is one gather from the
+        # scene's per-triangle tables
+        hit = tscene.triangles(tscene.triangle_index(geometry_ids, primitive_ids))
+        absorbed = hit['is_absorber']
+        reflected = ~absorbed
+
+        # check to see if ray has ended up inside mesh:
+        # get the projection along triangle surface normal of a vector pointing
+        # from triangle's centroid to intersection's position
+        # assume outward-facing normal, so a point inside has a negative
+        # projection
+        centroid = hit['centroid']
+        nhat = hit['normal']
+        nhat_reflect = nhat
+        refined = np.zeros(len(idx), dtype=bool)
+        if analytic_mirrors:
+            refined = reflected & np.isfinite(hit['quadric'][:, 0])
+            t_exact, n_exact = intersect_quadric(start[refined], t_hit[distance_finite][refined], hit['quadric'][refined])
+            close = np.abs(t_exact - t_hit[distance_finite][refined]) < MAX_REFINE_DISTANCE
+            refined[refined] = close
+            t_exact, n_exact = t_exact[close], n_exact[close]
+            end[refined, u_] = start[refined][:, u_] + start[refined][:, v_] * t_exact[:, None].astype(np.float32)
+            # facing the same way as the facet
+            n_exact *= np.sign(np.sum(n_exact * nhat[refined], axis=-1, keepdims=True))
+            nhat_reflect = nhat.copy()
+            nhat_reflect[refined] = n_exact
+        proj = np.sum((end[:, u_] - centroid) * nhat, axis=-1)
+        # exact hits on concave faces lie just behind their facets: lift them
+        # onto the facet so the next cast starts outside the mesh
+        lift = refined & (proj < 0)
+        end[lift, u_] += nhat[lift] * (1e-7 - proj[lift, None])
+        # fix errant interior intersections by flipping pos along the normal
+        inside = reflected & ~refined & (proj < 0)
+        correction_distance = np.maximum(1e-7, -2 * proj[inside])
+        end[inside, u_] += nhat[inside] * correction_distance[:, None]
+        if verbose and inside.any():
+            print(
+                f'WARNING: {inside.sum()} rays propagated inside meshes, ' +
+                'flipping pos about mesh normal, a max correction of ' +
+                f'{correction_distance.max()} m.'
+            )
+
+        # propagate rays that will be continuing on to next surface, the
+        # diffuse fraction into the hemisphere the ray came from
+        end[reflected, v_] = reflect(start[reflected][:, v_], nhat_reflect[reflected])
+        diffuse = reflected & (hit['diffuse'] > 0)
+        diffuse[diffuse] = rng.uniform(size=diffuse.sum()) < hit['diffuse'][diffuse]
+        if diffuse.any():
+            side = -np.sign(np.sum(start[diffuse][:, v_] * nhat_reflect[diffuse], axis=-1, keepdims=True))
+            end[diffuse, v_] = lambertian(side * nhat_reflect[diffuse], rng)
+        paths.append(idx, end, geometry_ids, weight[idx], weight[idx] * hit['absorptance'])
+
+        # terminate if absorbed or trapped
+        terminated[idx[absorbed]] = True
+        idx = idx[reflected]
+        geometry_ids = geometry_ids[reflected]
+        part = hit['part'][reflected]
+        weight[idx] *= hit['reflectance'][reflected]
+        if min_weight > 0:
+            low = np.flatnonzero(weight[idx] < min_weight)
+            survive = rng.uniform(size=len(low)) < weight[idx[low]] / min_weight
+            weight[idx[low[survive]]] = min_weight
+            terminated[idx[low[~survive]]] = True
+            if verbose and low.size:
+                print(f'Russian roulette ends {(~survive).sum()} of {len(low)} low-weight paths')
+        again = (last_mesh[idx] == geometry_ids) & (last_part[idx] == part)
+        n_consecutive[idx] = np.where(again, n_consecutive[idx] + 1, 1)
+        last_mesh[idx] = geometry_ids
+        last_part[idx] = part
+        trapped = n_consecutive[idx] > max_consecutive_hits
+        if verbose and trapped.any():
+            print(
+                f'WARNING: {trapped.sum()} paths hit the same surface more than ' +
+                f'{max_consecutive_hits} times in a row. Terminating.'
+            )
+        terminated[idx[trapped]] = True
+
+        timing.record(
+            'bounce', time.perf_counter() - t_bounce - cast_seconds,
+            n_rays=len(live), bounce=i_bounce, n_hits=int(distance_finite.sum())
+        )
+        i_bounce += 1
+
+    if verbose:
+        print(f'Simulation terminated after {i_bounce} bounces.')
+
+    return paths
+
+
+def trace_chunks(tscene, chunks, N_bounces, max_consecutive_hits,
+                 check_incident=False, min_weight=0., seed=SEED, stats=None,
+                 analytic_mirrors=False):
+    # trace a stream of ray chunks, e.g. from ray_sets.random_disc_chunks,
+    # reducing each chunk's paths into RunningStats before the next is
+    # traced, so memory stays flat in the total number of rays. Chunk i
+    # draws its roulette and diffuse reflections from its own random stream,
+    # independent of the one its rays were drawn from.
+    if stats is None:
+        stats = RunningStats(len(tscene.mesh_ids))
+    for i_chunk, rays in enumerate(chunks):
+        paths = trace(
+            tscene,
+            rays,
+            N_bounces,
+            max_consecutive_hits,
+            check_incident=check_incident,
+            min_weight=min_weight,
+            rng=rng_stream(seed, i_chunk, TRACE_STREAM),
+            analytic_mirrors=analytic_mirrors
+        )
+        stats.add(paths)
+    return stats